@@ -0,0 +1,25 @@
+"""add outbox failed_at
+
+Revision ID: 5b7e2c9a1d40
+Revises: d4f2b8e61a37
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9a1d40'
+down_revision = 'd4f2b8e61a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Set when delivery is given up on; such rows are kept for inspection, not retried
+    op.add_column('outbox', sa.Column('failed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('outbox', 'failed_at')
@@ -0,0 +1,66 @@
+"""covering email index
+
+Revision ID: 8a4e6c1f2b90
+Revises: 3f1c2a9d7b4e
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c1f2b90'
+down_revision = '3f1c2a9d7b4e'
+branch_labels = None
+depends_on = None
+
+# Rows lower-cased per transaction, so no batch holds its row locks for long
+LOWERCASE_BATCH_SIZE = 1000
+
+
+def check_case_duplicates():
+    """Fail before changing anything if two accounts differ only in case."""
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT lower(email), array_agg(id ORDER BY id) FROM "user" '
+        'GROUP BY lower(email) HAVING count(*) > 1 ORDER BY 1 LIMIT 50'
+    )).all()
+    if duplicates:
+        listed = "\n".join(f"  {email}: user ids {ids}" for email, ids in duplicates)
+        raise RuntimeError(
+            "These emails are registered more than once in different case and "
+            f"have to be merged or renamed by hand before upgrading:\n{listed}"
+        )
+
+
+def swap_email_index(**kw):
+    """
+    Build the new ix_user_email next to the old one and swap the names,
+    without blocking writes and with an email index enforcing uniqueness
+    throughout. A half-built index left by an interrupted run is dropped first.
+    """
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_user_email_new')
+        op.create_index(
+            'ix_user_email_new', 'user', ['email'], unique=True,
+            postgresql_concurrently=True, **kw,
+        )
+        op.execute('DROP INDEX CONCURRENTLY ix_user_email')
+        op.execute('ALTER INDEX ix_user_email_new RENAME TO ix_user_email')
+
+
+def upgrade():
+    # Emails are compared lower-cased from now on
+    check_case_duplicates()
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while bind.execute(sa.text(
+            'UPDATE "user" SET email = lower(email) WHERE id IN ('
+            'SELECT id FROM "user" WHERE email <> lower(email) LIMIT :batch)'
+        ), {"batch": LOWERCASE_BATCH_SIZE}).rowcount:
+            pass
+    swap_email_index(postgresql_include=['id', 'hashed_password', 'is_active'])
+
+
+def downgrade():
+    swap_email_index()
@@ -0,0 +1,27 @@
+"""add user version
+
+Revision ID: d4f2b8e61a37
+Revises: c51d7e0a9f36
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f2b8e61a37'
+down_revision = 'c51d7e0a9f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default, so existing rows are not rewritten
+    op.add_column(
+        'user', sa.Column('version', sa.Integer(), nullable=False, server_default='1')
+    )
+
+
+def downgrade():
+    op.drop_column('user', 'version')
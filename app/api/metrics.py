@@ -0,0 +1,113 @@
+import secrets
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app import crud
+from app.core.config import settings
+from app.db.session import engine, replica_engine
+from app.deps.cash_service import CashService
+from app.utils import email_queue, hasher, metrics
+from app.utils.rate_limit import rate_limiter
+from app.utils.token_cache import token_cache
+from app.workers import outbox_dispatcher, revocation_index
+
+router = APIRouter()
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+DB_POOL_CONNECTIONS = metrics.gauge(
+    "db_pool_connections", "Connections in the pool by state", ["state"]
+)
+DB_POOL_SIZE = metrics.gauge("db_pool_size", "Configured pool size, not counting overflow")
+DB_REPLICA_POOL_CONNECTIONS = metrics.gauge(
+    "db_replica_pool_connections", "Read replica connections in the pool by state", ["state"]
+)
+HASHING_JOBS = metrics.gauge("password_hashing_jobs", "Hashing jobs by state", ["state"])
+HASHING_POOL_SIZE = metrics.gauge("password_hashing_pool_size", "Hashing worker processes")
+CASH_SERVICE_BREAKER = metrics.gauge(
+    "cash_service_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open"
+)
+EMAIL_QUEUE = metrics.gauge("email_queue_messages", "Emails waiting to be sent", ["state"])
+EMAILS = metrics.counter("emails", "Emails handled by the queue", ["result"])
+CACHE_ENTRIES = metrics.gauge("cache_entries", "Entries held by a cache", ["cache"])
+CACHE_LOOKUPS = metrics.counter("cache_lookups", "Cache lookups by result", ["cache", "result"])
+OUTBOX_PENDING = metrics.gauge("outbox_pending", "Undelivered cash consumer outbox rows")
+OUTBOX_LAG = metrics.gauge("outbox_lag_seconds", "Age of the oldest undelivered outbox row")
+OUTBOX_DEAD = metrics.gauge("outbox_dead", "Outbox rows given up on and no longer retried")
+OUTBOX_DELIVERIES = metrics.counter(
+    "outbox_deliveries", "Outbox delivery attempts by this worker", ["result"]
+)
+RATE_LIMIT_KEYS = metrics.gauge("rate_limit_keys", "Keys tracked by the per-worker rate limiter")
+REVOCATION_CHECKS = metrics.counter(
+    "token_revocation_checks", "Revocation checks by how they were answered", ["result"]
+)
+
+
+def collect() -> None:
+    pool = engine.sync_engine.pool
+    DB_POOL_SIZE.set(pool.size())
+    DB_POOL_CONNECTIONS.set(pool.checkedout(), state="checked_out")
+    DB_POOL_CONNECTIONS.set(pool.checkedin(), state="idle")
+    DB_POOL_CONNECTIONS.set(max(0, pool.overflow()), state="overflow")
+    if replica_engine is not None:
+        pool = replica_engine.sync_engine.pool
+        DB_REPLICA_POOL_CONNECTIONS.set(pool.checkedout(), state="checked_out")
+        DB_REPLICA_POOL_CONNECTIONS.set(pool.checkedin(), state="idle")
+        DB_REPLICA_POOL_CONNECTIONS.set(max(0, pool.overflow()), state="overflow")
+
+    stats = hasher.stats()
+    HASHING_POOL_SIZE.set(stats["pool_size"])
+    HASHING_JOBS.set(stats["queue_depth"], state="queued")
+    HASHING_JOBS.set(stats["running"], state="running")
+
+    CASH_SERVICE_BREAKER.set(BREAKER_STATES[CashService.breaker.state])
+
+    stats = email_queue.stats()
+    EMAIL_QUEUE.set(stats["queued"], state="queued")
+    EMAIL_QUEUE.set(stats["retrying"], state="retrying")
+    EMAILS.set(stats["sent"], result="sent")
+    EMAILS.set(stats["failed"], result="failed")
+
+    caches = {"token": token_cache.stats()}
+    if crud.user.cache is not None:
+        caches["user"] = crud.user.cache.stats()
+    for name, stats in caches.items():
+        if "size" in stats:
+            CACHE_ENTRIES.set(stats["size"], cache=name)
+        for result in ("hits", "misses", "coalesced"):
+            if result in stats:
+                CACHE_LOOKUPS.set(stats[result], cache=name, result=result)
+
+    stats = outbox_dispatcher.stats()
+    OUTBOX_PENDING.set(stats["pending"])
+    OUTBOX_LAG.set(stats["lag_seconds"])
+    OUTBOX_DEAD.set(stats["dead"])
+    OUTBOX_DELIVERIES.set(stats["delivered"], result="delivered")
+    OUTBOX_DELIVERIES.set(stats["failed"], result="failed")
+    OUTBOX_DELIVERIES.set(stats["given_up"], result="given_up")
+
+    if rate_limiter is not None and "size" in rate_limiter.stats():
+        RATE_LIMIT_KEYS.set(rate_limiter.stats()["size"])
+
+    stats = revocation_index.stats()
+    REVOCATION_CHECKS.set(stats["checks"] - stats["confirmations"], result="filter")
+    REVOCATION_CHECKS.set(stats["confirmations"] - stats["revoked"], result="false_positive")
+    REVOCATION_CHECKS.set(stats["revoked"], result="revoked")
+
+
+metrics.REGISTRY.add_collector(collect)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def read_metrics(request: Request) -> Response:
+    """
+    Metrics of this worker in the Prometheus text format.
+    """
+    if not secrets.compare_digest(
+        request.headers.get("authorization", "").encode(),
+        f"Bearer {settings.METRICS_TOKEN}".encode(),
+    ):
+        raise HTTPException(status_code=403, detail="Not authorized to read metrics")
+    return Response(
+        content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
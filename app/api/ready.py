@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.warmup import readiness
+
+router = APIRouter()
+
+
+@router.get("/ready", include_in_schema=False)
+def read_readiness() -> JSONResponse:
+    """
+    200 once this worker has warmed up, 503 before that and while it drains.
+    """
+    return JSONResponse(readiness.stats(), status_code=200 if readiness.ready else 503)
@@ -0,0 +1,84 @@
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from jose import jwt
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, models, schemas, deps
+from app.core.config import settings
+from app.utils.content_types import read_body, render
+from app.utils.keyring import ACCESS_TOKEN, keyring
+from app.workers.revocation import revocation_index
+
+router = APIRouter()
+
+USER_COLUMNS = ("id", "email", "is_active", "is_superuser", "nickname")
+
+
+def decode_tokens(tokens: List[str]) -> Dict[str, Optional[schemas.TokenPayload]]:
+    claims: Dict[str, Optional[schemas.TokenPayload]] = {}
+    for token in tokens:
+        if token in claims:
+            continue
+        try:
+            claims[token] = schemas.TokenPayload(**keyring.decode(token, ACCESS_TOKEN))
+        except (jwt.JWTError, ValidationError):
+            claims[token] = None
+    return claims
+
+
+@router.post("", response_model=schemas.TokenIntrospectionResponse)
+async def introspect_tokens(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> Response:
+    """
+    Validate many access tokens at once.
+
+    Takes `{"tokens": [...]}` as JSON or MessagePack (by Content-Type) and
+    answers in the format the Accept header asks for, with one result per
+    token in request order. Tokens that are invalid, expired, revoked or
+    belong to an inactive user come back as `{"active": false}`.
+    """
+    try:
+        token_in = schemas.TokenIntrospectionRequest.parse_obj(await read_body(request))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    if len(token_in.tokens) > settings.INTROSPECTION_MAX_TOKENS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.INTROSPECTION_MAX_TOKENS} tokens per request",
+        )
+
+    # Signature checks are CPU-bound, keep them off the event loop
+    claims = await run_in_threadpool(decode_tokens, token_in.tokens)
+    for token, token_data in claims.items():
+        if token_data is not None and await revocation_index.is_revoked(db, token_data.jti):
+            claims[token] = None
+    users = {
+        row["id"]: row
+        for row in await crud.user.get_rows(
+            db,
+            ids=list({c.sub for c in claims.values() if c is not None}),
+            columns=USER_COLUMNS,
+        )
+    }
+
+    results = []
+    for token in token_in.tokens:
+        token_data = claims[token]
+        user = users.get(token_data.sub) if token_data is not None else None
+        if user is None or not user["is_active"]:
+            results.append({"active": False})
+            continue
+        results.append({
+            "active": True,
+            "sub": token_data.sub,
+            "exp": token_data.exp,
+            "jti": token_data.jti,
+            "user": dict(user),
+        })
+    return render(request, {"results": results})
@@ -1,50 +1,146 @@
-from datetime import timedelta
-from typing import Any
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas, deps, utils
 from app.core.config import settings
+from app.db.routing import pin_to_primary
+from app.db.session import SessionLocal
 from app.schemas.user import UserUpdate
+from app.utils.rate_limit import rate_limiter
+from app.workers.revocation import revocation_index
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+async def rehash_password(user_id: int, password: str, old_hash: str) -> None:
+    try:
+        new_hash = await utils.hasher.rehash(password)
+        async with SessionLocal() as db:
+            await crud.user.rehash_password(db, id=user_id, old_hash=old_hash, new_hash=new_hash)
+    except Exception:
+        logger.exception(f"rehashing the password of user {user_id} failed")
+
+
 @router.post("/access-token", response_model=schemas.Token)
-def login_access_token(
-    db: Session = Depends(deps.get_db), 
+async def login_access_token(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(deps.get_db), 
     form_data: OAuth2PasswordRequestForm = Depends(),
 ):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.user.get_with_email(db, email=form_data.username)
-    if not user: # 아이디 확인
+    if rate_limiter is not None:
+        await rate_limiter.check("login", request, email=form_data.username)
+    credentials = await crud.user.get_credentials(db, email=form_data.username)
+    if not credentials: # 아이디 확인
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    if not utils.verify_password(form_data.password, user.hashed_password): # 비밀번호 확인
+    verified, needs_update = await utils.hasher.verify_needs_update(
+        form_data.password, credentials.hashed_password
+    )
+    if not verified: # 비밀번호 확인
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    if not user.is_active:
+    if not credentials.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    if needs_update and settings.PASSWORD_REHASH_ON_LOGIN:
+        # After the response is sent, so the login does not pay for a second hash
+        background_tasks.add_task(
+            rehash_password, credentials.id, form_data.password, credentials.hashed_password
+        )
+    refresh_token = crud.refresh_token.issue(
+        db, obj_in=schemas.RefreshTokenCreate(user_id=credentials.id)
+    )
+    await db.commit()
     return {
         "access_token": utils.create_access_token(
-            user.id, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            credentials.id, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         ),
         "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
     }
 
 
+@router.post("/access-token/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    db: AsyncSession = Depends(deps.get_db),
+    *,
+    token_in: schemas.TokenRefresh,
+):
+    """
+    Trade a refresh token for a new access token and a new refresh token
+    """
+    rotated = await crud.refresh_token.rotate(db, token=token_in.refresh_token)
+    # Also persists the family revocation when a spent token was replayed
+    await db.commit()
+    if rotated is None:
+        raise HTTPException(status_code=400, detail="Invalid refresh token")
+    user_id, family_id = rotated
+    user = await crud.user.get(db, id=user_id)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    refresh_token = crud.refresh_token.issue(
+        db, obj_in=schemas.RefreshTokenCreate(user_id=user_id, family_id=family_id)
+    )
+    await db.commit()
+    return {
+        "access_token": utils.create_access_token(
+            user_id, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        ),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.post("/logout", response_model=schemas.Msg)
+async def logout(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_user),
+    token_data: schemas.TokenPayload = Depends(deps.get_token_payload),
+    *,
+    refresh_token: Optional[str] = Body(None, embed=True),
+):
+    """
+    Revoke the access token and, if given, the refresh token of this login
+    """
+    if token_data.jti:
+        await crud.revoked_token.add(
+            db,
+            jti=token_data.jti,
+            user_id=current_user.id,
+            expires_at=datetime.fromtimestamp(token_data.exp, tz=timezone.utc),
+        )
+    if refresh_token:
+        await crud.refresh_token.revoke(db, token=refresh_token, user_id=current_user.id)
+    await db.commit()
+    await pin_to_primary(current_user.id)
+    if token_data.jti:
+        revocation_index.add(token_data.jti)
+    return {"msg": "Logged out"}
+
+
 @router.post("/forget", response_model=schemas.Msg)
-def forget_password(
-    db: Session = Depends(deps.get_db),
+async def forget_password(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
     *,
     email: str = Body(...)
 ):
     """
     Request to reset password
     """
-    user = crud.user.get_with_email(db, email=email)
+    if rate_limiter is not None:
+        await rate_limiter.check("reset", request, email=email)
+    user = await crud.user.get_with_email(db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -60,8 +156,8 @@ def forget_password(
 
 
 @router.post("/reset", response_model=schemas.Msg)
-def reset_password(
-    db: Session = Depends(deps.get_db),
+async def reset_password(
+    db: AsyncSession = Depends(deps.get_db),
     user: schemas.User = Depends(deps.get_active_user_with_reset_token),
     *,
     new_password: str = Body(...)
@@ -69,5 +165,6 @@ def reset_password(
     """
     Reset password
     """
-    crud.user.update(db, db_obj=user, password=UserUpdate(password=new_password))
+    await crud.user.update(db, db_obj=user, obj_in=UserUpdate(password=new_password))
+    await pin_to_primary(user.id)
     return {"msg": "Password updated successfully"}
@@ -1,77 +1,158 @@
-from typing import List
-from fastapi import APIRouter, Body, Depends, HTTPException
-from fastapi.encoders import jsonable_encoder
+from typing import List, Optional
+from fastapi import (
+    APIRouter, Body, Depends, File, HTTPException, Query, Request, Response, UploadFile
+)
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic.networks import EmailStr
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import json
+import zlib
 
 from app import crud, models, schemas, deps, utils
 from app.core.config import settings
+from app.db.routing import pin_to_primary
+from app.schemas.user_batch import USER_BATCH_FIELDS
+from app.utils.fast_response import USER_FIELDS, users_response
+from app.utils.rate_limit import rate_limiter
+from app.utils.user_import import FORMATS, MAX_CHUNK_SIZE, UserImporter, parse_file
 
 
 router = APIRouter()
 
+STALE_USER_DETAIL = "The user was changed by another request, reload it and try again"
+MISSING_USER_DETAIL = "The user with this username does not exist in the system"
+
 
 @router.get("", response_model=List[schemas.User])
-def read_users(
-    db: Session = Depends(deps.get_db),
+async def read_users(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_read_db),
     current_user: models.User = Depends(deps.get_current_active_superuser),
     *,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.USERS_PAGE_MAX_LIMIT),
+):
+    """
+    Retrieve users ordered by id.
+
+    Pass the `X-Next-Cursor` response header back as `cursor` to get the
+    next page. `skip` is kept for old clients and gets slower the deeper it goes.
+    """
+    # Plain rows are enough when they are encoded without the response model
+    columns = USER_FIELDS if settings.FAST_RESPONSES else None
+    if skip and cursor is None:
+        users = await crud.user.get_multi(db, skip=skip, limit=limit, columns=columns)
+        return users_response(users)
+    after_id = None
+    if cursor is not None:
+        after_id = utils.decode_cursor(cursor)
+        if after_id is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    users = await crud.user.get_multi_after(
+        db, after_id=after_id, limit=limit, columns=columns
+    )
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(users[-1].id)
+    return users_response(users, response)
+
+
+@router.get("/export")
+async def export_users(
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
 ):
     """
-    Retrieve users.
+    Stream every user as newline-delimited JSON, gzipped if the client accepts it.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
-    return users
+    columns = list(schemas.User.__fields__)
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+
+    async def ndjson():
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if use_gzip else None
+        lines = []
+        async for row in crud.user.stream(db, columns=columns):
+            lines.append(json.dumps(dict(row), separators=(",", ":")))
+            if len(lines) >= 1000:
+                chunk = ("\n".join(lines) + "\n").encode()
+                lines = []
+                yield compressor.compress(chunk) if compressor else chunk
+        chunk = ("\n".join(lines) + "\n").encode() if lines else b""
+        yield compressor.compress(chunk) + compressor.flush() if compressor else chunk
+
+    headers = {"Content-Encoding": "gzip"} if use_gzip else {}
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers)
 
 
 @router.get("/me", response_model=schemas.User)
-def read_user_me(
-    db: Session = Depends(deps.get_db),
+async def read_user_me(
+    db: AsyncSession = Depends(deps.get_read_db),
     current_user: models.User = Depends(deps.get_current_active_user),
 ):
     """
     Get current user.
     """
-    return current_user
+    return users_response(current_user)
+
+
+@router.put("/me", response_model=schemas.User)
+async def update_user_me(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: schemas.User = Depends(deps.get_current_active_user),
+    *,
+    password: str = Body(None),
+    nickname: str = Body(None),
+    email: EmailStr = Body(None),
+    version: int = Body(None),
+):
+    """
+    Update own user.
+
+    Only the fields given are written. Pass the `version` the change is
+    based on to get a 409 instead of overwriting someone else's change.
+    """
+    changes = {"password": password, "nickname": nickname, "email": email, "version": version}
+    user_in = schemas.UserUpdate(**{k: v for k, v in changes.items() if v is not None})
+    try:
+        user = await crud.user.update(db, db_obj=current_user, obj_in=user_in)
+    except crud.StaleVersionError:
+        raise HTTPException(status_code=409, detail=STALE_USER_DETAIL)
+    if user is None:
+        raise HTTPException(status_code=404, detail=MISSING_USER_DETAIL)
+    await pin_to_primary(user.id)
+    return users_response(user)
 
 
 @router.post("", response_model=schemas.User)
 async def create_user(
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     current_user: models.User = Depends(deps.get_current_active_superuser),
-    cash_service: deps.CashService = Depends(),
     *,
     user_in: schemas.UserCreate,
 ):
     """
     Create new user.
     """
-    user = crud.user.get_with_email(db, email=user_in.email)
-    if user:
+    user = await crud.user.create(db, obj_in=user_in)
+    if user is None:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system.")
-    user = crud.user.create(db, obj_in=user_in)
+    await pin_to_primary(current_user.id, user.id)
     if settings.EMAILS_ENABLED and user_in.email:
         utils.send_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
-    token= utils.create_access_token(
-        user.id, 
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-
-    await cash_service.create_consumer(token)
-    return user
+    return users_response(user)
 
 
 @router.post("/open", response_model=schemas.User)
 async def create_user_open(
-    db: Session = Depends(deps.get_db),
-    cash_service: deps.CashService = Depends(),
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
     *,
     password: str = Body(...),
     email: EmailStr = Body(...),
@@ -85,13 +166,8 @@ async def create_user_open(
             status_code=403,
             detail="Open user registration is forbidden on this server",
         )
-    user = crud.user.get_with_email(db, email=email)
-    if user:
-        raise HTTPException(
-            status_code=400,
-            detail="The user with this username already exists in the system",
-        )
-        
+    if rate_limiter is not None:
+        await rate_limiter.check("signup", request, email=email)
     if len(nickname) > 13:
         raise HTTPException(
             status_code=400,
@@ -99,19 +175,96 @@ async def create_user_open(
         )
 
     user_in = schemas.UserCreate(password=password, email=email, nickname=nickname)
-    user = crud.user.create(db, obj_in=user_in)
-    token= utils.create_access_token(
-        user.id, 
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    user = await crud.user.create(db, obj_in=user_in)
+    if user is None:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this username already exists in the system",
+        )
+    await pin_to_primary(user.id)
+    return users_response(user)
 
-    await cash_service.create_consumer(token)
-    return user
+
+@router.post("/import", response_model=schemas.UserImportResult)
+async def import_users_file(
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+    *,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    chunk_size: int = 1000,
+):
+    """
+    Bulk-create users from a CSV (with a header row) or NDJSON file.
+
+    Columns are those of user creation: email, password, nickname,
+    is_active, is_superuser. Rows that fail are reported, the rest are created.
+    For very large imports prefer app/script/import_users.py.
+    """
+    format = format or (file.filename or "").rsplit(".", 1)[-1].lower()
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported format, expected one of {FORMATS}"
+        )
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400, detail=f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}"
+        )
+    # One byte over the limit is enough to tell, without holding more of the file
+    content = await file.read(settings.USERS_IMPORT_MAX_BYTES + 1)
+    if len(content) > settings.USERS_IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"The file is larger than {settings.USERS_IMPORT_MAX_BYTES} bytes, "
+            "use app/script/import_users.py",
+        )
+    try:
+        rows = await run_in_threadpool(parse_file, content, format)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The file is not UTF-8 encoded")
+    result = await UserImporter(chunk_size=chunk_size).run(rows)
+    await pin_to_primary(current_user.id)
+    return result
+
+
+@router.post(
+    "/batch", response_model=schemas.UserBatchResponse, response_model_exclude_unset=True
+)
+async def read_users_batch(
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+    *,
+    batch_in: schemas.UserBatchRequest,
+):
+    """
+    Resolve many users by id and/or email at once.
+
+    Results come back in request order with null for misses. Pass `fields`
+    to get only those columns, e.g. `["id", "nickname"]`.
+    """
+    if len(batch_in.ids) + len(batch_in.emails) > settings.USERS_BATCH_MAX_KEYS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.USERS_BATCH_MAX_KEYS} ids and emails per request",
+        )
+    fields = batch_in.fields or USER_BATCH_FIELDS
+    rows = await crud.user.get_batch(
+        db, ids=batch_in.ids, emails=batch_in.emails, columns=fields
+    )
+    by_id = {}
+    by_email = {}
+    for row in rows:
+        user = {field: row[field] for field in fields}
+        by_id[row["id"]] = user
+        by_email[row["email"]] = user
+    return {
+        "ids": [by_id.get(id) for id in batch_in.ids],
+        "emails": [by_email.get(email) for email in batch_in.emails],
+    }
 
 
 @router.put("/{user_id}", response_model=schemas.User)
-def update_user(
-    db: Session = Depends(deps.get_db),
+async def update_user(
+    db: AsyncSession = Depends(deps.get_db),
     current_user: schemas.User = Depends(deps.get_current_active_superuser),
     *,
     user_id: int,
@@ -120,35 +273,18 @@ def update_user(
     """
     Update a user.
     """
-    user = crud.user.get(db, id=user_id)
+    user = await crud.user.get(db, id=user_id)
     if not user:
         raise HTTPException(
             status_code=404,
-            detail="The user with this username does not exist in the system",
+            detail=MISSING_USER_DETAIL,
         )
-    user = crud.user.update(db, db_obj=user, obj_in=user_in)
-    return user
-
-
-@router.put("/me", response_model=schemas.User)
-def update_user_me(
-    db: Session = Depends(deps.get_db),
-    current_user: schemas.User = Depends(deps.get_current_active_user),
-    *,
-    password: str = Body(None),
-    nickname: str = Body(None),
-    email: EmailStr = Body(None),
-):
-    """
-    Update own user.
-    """
-    current_user_data = jsonable_encoder(current_user)
-    user_in = schemas.UserUpdate(**current_user_data)
-    if password is not None:
-        user_in.password = password
-    if nickname is not None:
-        user_in.nickname = nickname
-    if email is not None:
-        user_in.email = email
-    user = crud.user.update(db, db_obj=current_user, obj_in=user_in)
-    return user
\ No newline at end of file
+    try:
+        user = await crud.user.update(db, db_obj=user, obj_in=user_in)
+    except crud.StaleVersionError:
+        raise HTTPException(status_code=409, detail=STALE_USER_DETAIL)
+    if user is None:
+        # Deleted since it was read, possibly from the cache
+        raise HTTPException(status_code=404, detail=MISSING_USER_DETAIL)
+    await pin_to_primary(current_user.id, user.id)
+    return users_response(user)
@@ -0,0 +1,24 @@
+import hashlib
+
+from fastapi import APIRouter, Request, Response
+
+from app.core.config import settings
+from app.utils.keyring import keyring
+
+router = APIRouter()
+
+
+@router.get("/.well-known/jwks.json", include_in_schema=False)
+def read_jwks(request: Request) -> Response:
+    """
+    Public keys for verifying our tokens locally, cacheable by clients.
+    """
+    body = keyring.jwks()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
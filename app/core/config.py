@@ -1,31 +1,72 @@
-import secrets
 from typing import Any, Dict, List, Optional, Union
 
 from pydantic import AnyHttpUrl, BaseSettings, EmailStr, HttpUrl, PostgresDsn, validator
 
 import os
-import json
+import re
 import base64
+from pathlib import Path
 
-from dotenv import load_dotenv
+# Look for .env only where it is kept rather than searching up from the caller
+DOTENV_PATH = Path(os.getenv("DOTENV_PATH", Path(__file__).resolve().parents[2] / ".env"))
+if DOTENV_PATH.is_file():
+    from dotenv import load_dotenv
 
-load_dotenv()
+    load_dotenv(DOTENV_PATH)
 
 
 class Settings(BaseSettings):
     API_V1_STR: str = os.getenv("API_V1_STR","/api/v1")
     PROJECT_NAME: str = os.getenv("PROJECT_NAME")
     
-    SECRET_KEY: str = secrets.token_urlsafe(32)
+    # Only used to sign tokens when JWT_KEYS_DIR is unset; must be the same in every
+    # worker, so the app refuses to start with neither of them set
+    SECRET_KEY: Optional[str] = os.getenv("SECRET_KEY")
+    # Directory of <kid>.pem RSA/EC keys, rescanned for rotation every JWT_KEYS_RELOAD_SECONDS
+    JWT_KEYS_DIR: Optional[str] = os.getenv("JWT_KEYS_DIR")
+    JWT_KEYS_RELOAD_SECONDS: float = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", 30))
+    JWKS_MAX_AGE_SECONDS: int = int(os.getenv("JWKS_MAX_AGE_SECONDS", 300))
     TOKEN_URL: str = os.getenv("TOKEN_URL")
-    # 60 minutes * 24 hours * 1 days = 1 days
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 1
+    # Access tokens are short-lived and renewed with a rotating refresh token
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+    # Revoked access token ids, per worker, synced from the database
+    REVOCATION_SYNC_SECONDS: float = float(os.getenv("REVOCATION_SYNC_SECONDS", 5))
+    REVOCATION_INDEX_CAPACITY: int = int(os.getenv("REVOCATION_INDEX_CAPACITY", 100000))
+    REVOCATION_INDEX_ERROR_RATE: float = float(os.getenv("REVOCATION_INDEX_ERROR_RATE", 0.001))
+    # Expired revoked/refresh token rows are deleted about this often, by one worker at a time
+    REVOCATION_PRUNE_SECONDS: float = float(os.getenv("REVOCATION_PRUNE_SECONDS", 3600))
+    INTROSPECTION_MAX_TOKENS: int = int(os.getenv("INTROSPECTION_MAX_TOKENS", 1000))
+    USERS_BATCH_MAX_KEYS: int = int(os.getenv("USERS_BATCH_MAX_KEYS", 1000))
+    USERS_PAGE_MAX_LIMIT: int = int(os.getenv("USERS_PAGE_MAX_LIMIT", 1000))
+    # Uploads to /users/import are read into memory; larger files go through the CLI
+    USERS_IMPORT_MAX_BYTES: int = int(os.getenv("USERS_IMPORT_MAX_BYTES", 20 * 1024 * 1024))
+    # Encode user responses straight from rows, with orjson when it is installed,
+    # instead of validating them again through the response model
+    FAST_RESPONSES: bool = os.getenv("FAST_RESPONSES", "false") == "true"
+
+    # Prometheus metrics on /metrics, per worker, for holders of METRICS_TOKEN as a bearer token
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false") == "true"
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN")
+
+    @validator("METRICS_TOKEN")
+    def require_metrics_token(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
+        # Metrics show traffic, queue depths and backlogs; never serve them to anyone
+        if values.get("METRICS_ENABLED") and not v:
+            raise ValueError("METRICS_ENABLED needs METRICS_TOKEN to be set")
+        return v
+
+    # Requests signed with PROFILING_SECRET (see app/script/profile_header.py) are profiled
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false") == "true"
+    PROFILING_SECRET: Optional[str] = os.getenv("PROFILING_SECRET")
+    PROFILING_MAX_AGE_SECONDS: float = float(os.getenv("PROFILING_MAX_AGE_SECONDS", 300))
+    PROFILING_OUTPUT_DIR: Optional[str] = os.getenv("PROFILING_OUTPUT_DIR")
     ENCRYPT_ALGORITHM = os.getenv("ENCRYPT_ALGORITHM")
     # BACKEND_CORS_ORIGINS is a JSON-formatted list of origins
     # e.g: '["http://localhost", "http://localhost:4200", "http://localhost:3000", \
     # "http://localhost:8080", "http://local.dockertoolbox.tiangolo.com"]'
-    BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = json.loads(
-        os.getenv("BACKEND_CORS_ORIGINS"))
+    # Read from the environment with the other settings, not while the class is defined
+    BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
     s: str = os.getenv("CASH_SERVICE_BASE_URL")
 
@@ -42,8 +83,46 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD")
     POSTGRES_DB: str = os.getenv("POSTGRES_DB")
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # Read-only endpoints go to this replica (same credentials), if set
+    POSTGRES_REPLICA_SERVER: Optional[str] = os.getenv("POSTGRES_REPLICA_SERVER")
+
+    # Per engine; DB_POOL_RECYCLE of -1 keeps connections forever
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    # "always" pings on every checkout, "idle" only connections idle for longer than
+    # DB_POOL_PRE_PING_IDLE_SECONDS, "never" relies on recycling and reconnect on error
+    DB_POOL_PRE_PING: str = os.getenv("DB_POOL_PRE_PING", "idle")
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = float(os.getenv("DB_POOL_PRE_PING_IDLE_SECONDS", 30))
+    # After a user's own write their reads stay on the primary this long; above replica lag.
+    # "memory" keeps the pins per worker, "redis" shares them (needs the redis package)
+    DB_READ_YOUR_WRITES_SECONDS: int = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+    DB_READ_YOUR_WRITES_BACKEND: str = os.getenv("DB_READ_YOUR_WRITES_BACKEND", "memory")
+    DB_READ_YOUR_WRITES_URL: Optional[str] = os.getenv("DB_READ_YOUR_WRITES_URL")
+    DB_READ_YOUR_WRITES_MAX_USERS: int = int(os.getenv("DB_READ_YOUR_WRITES_MAX_USERS", 100000))
 
     CASH_SERVICE_BASE_URL: str = os.getenv("CASH_SERVICE_BASE_URL")
+    CASH_SERVICE_MAX_CONNECTIONS: int = int(os.getenv("CASH_SERVICE_MAX_CONNECTIONS", 100))
+    CASH_SERVICE_KEEPALIVE_SECONDS: float = float(os.getenv("CASH_SERVICE_KEEPALIVE_SECONDS", 30))
+    CASH_SERVICE_CONNECT_TIMEOUT: float = float(os.getenv("CASH_SERVICE_CONNECT_TIMEOUT", 2))
+    CASH_SERVICE_READ_TIMEOUT: float = float(os.getenv("CASH_SERVICE_READ_TIMEOUT", 5))
+    CASH_SERVICE_RETRIES: int = int(os.getenv("CASH_SERVICE_RETRIES", 2))
+    CASH_SERVICE_RETRY_BACKOFF_SECONDS: float = float(os.getenv("CASH_SERVICE_RETRY_BACKOFF_SECONDS", 0.1))
+    CASH_SERVICE_BREAKER_THRESHOLD: int = int(os.getenv("CASH_SERVICE_BREAKER_THRESHOLD", 5))
+    CASH_SERVICE_BREAKER_RESET_SECONDS: float = float(os.getenv("CASH_SERVICE_BREAKER_RESET_SECONDS", 30))
+
+    # Cash consumers are provisioned from the outbox table in the background
+    OUTBOX_DISPATCHER_ENABLED: bool = os.getenv("OUTBOX_DISPATCHER_ENABLED", "true") == "true"
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+    OUTBOX_POLL_SECONDS: float = float(os.getenv("OUTBOX_POLL_SECONDS", 1))
+    OUTBOX_MAX_BACKOFF_SECONDS: float = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", 300))
+    # How long a claimed row is left to its dispatcher before another may retry it
+    OUTBOX_LEASE_SECONDS: float = float(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+    # Rows still failing after this many attempts are kept but no longer retried
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 20))
+    # How often the backlog behind the outbox_pending/outbox_lag_seconds metrics is counted
+    OUTBOX_BACKLOG_REFRESH_SECONDS: float = float(os.getenv("OUTBOX_BACKLOG_REFRESH_SECONDS", 15))
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -57,7 +136,35 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
-    SMTP_TLS: bool = True
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+
+    @validator("ASYNC_SQLALCHEMY_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            user=values.get("POSTGRES_USER"),
+            password=values.get("POSTGRES_PASSWORD"),
+            host=values.get("POSTGRES_SERVER"),
+            path=f"/{values.get('POSTGRES_DB') or ''}",
+        )
+
+    ASYNC_SQLALCHEMY_REPLICA_URI: Optional[PostgresDsn] = None
+
+    @validator("ASYNC_SQLALCHEMY_REPLICA_URI", pre=True)
+    def assemble_async_replica_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str) or not values.get("POSTGRES_REPLICA_SERVER"):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            user=values.get("POSTGRES_USER"),
+            password=values.get("POSTGRES_PASSWORD"),
+            host=values.get("POSTGRES_REPLICA_SERVER"),
+            path=f"/{values.get('POSTGRES_DB') or ''}",
+        )
+
+    SMTP_TLS: bool = os.getenv("SMTP_TLS", "true") == "true"
     SMTP_PORT: Optional[int] = int(os.getenv("SMTP_PORT"))
     SMTP_HOST: Optional[str] = os.getenv("SMTP_HOST")
     SMTP_USER: Optional[str] = os.getenv("SMTP_USER")
@@ -73,7 +180,7 @@ class Settings(BaseSettings):
         return v
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
-    EMAIL_TEMPLATES_DIR: str = "/app/app/email-templates/build"
+    EMAIL_TEMPLATES_DIR: str = os.getenv("EMAIL_TEMPLATES_DIR", "/app/app/email-templates/build")
     EMAILS_ENABLED: bool = False
 
     @validator("EMAILS_ENABLED", pre=True)
@@ -87,6 +194,68 @@ class Settings(BaseSettings):
     EMAIL_TEST_USER: EmailStr = "test@example.com"  # type: ignore
     FIRST_SUPERUSER: EmailStr = os.getenv("FIRST_SUPERUSER")
     FIRST_SUPERUSER_PASSWORD: str = os.getenv("FIRST_SUPERUSER_PASSWORD")
-    USERS_OPEN_REGISTRATION: bool = os.getenv("USERS_OPEN_REGISTRATION") == True
+    USERS_OPEN_REGISTRATION: bool = os.getenv("USERS_OPEN_REGISTRATION", "false") == "true"
+
+    # New passwords are hashed with the first scheme ("argon2" needs argon2-cffi); older
+    # hashes verify with any listed scheme and are redone at the current cost on login.
+    # Pick the cost with app/script/calibrate_hashing.py on the deployment hardware
+    PASSWORD_SCHEMES: str = os.getenv("PASSWORD_SCHEMES", "bcrypt")
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", 3))
+    ARGON2_MEMORY_KIB: int = int(os.getenv("ARGON2_MEMORY_KIB", 65536))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", 1))
+    PASSWORD_REHASH_ON_LOGIN: bool = os.getenv("PASSWORD_REHASH_ON_LOGIN", "true") == "true"
+
+    # Password hashing runs in a process pool; requests beyond pool + queue get a 503
+    HASHING_POOL_SIZE: int = int(os.getenv("HASHING_POOL_SIZE", os.cpu_count() or 1))
+    HASHING_QUEUE_SIZE: int = int(os.getenv("HASHING_QUEUE_SIZE", 64))
+    HASHING_MAX_WAIT_SECONDS: float = float(os.getenv("HASHING_MAX_WAIT_SECONDS", 2))
+
+    # Validated access tokens, per worker; bounds how stale a cached user can be
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+    TOKEN_CACHE_TTL_SECONDS: float = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 60))
+
+    # Read-through cache under crud.user.get / get_with_email:
+    # "memory" (per worker), "redis" (shared, needs the redis package), "fake" or "none"
+    USER_CACHE_BACKEND: str = os.getenv("USER_CACHE_BACKEND", "memory")
+    USER_CACHE_URL: Optional[str] = os.getenv("USER_CACHE_URL")
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+
+    # Attempts per client IP and per target email from one IP, as "<count>/<seconds>";
+    # empty disables a limit.
+    # "memory" keeps counters per worker, "redis" shares them (needs the redis package), "none" is off
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_URL: Optional[str] = os.getenv("RATE_LIMIT_URL")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+    # Only behind a proxy that sets X-Forwarded-For, or clients can pick their own key
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false") == "true"
+    RATE_LIMIT_LOGIN_IP: str = os.getenv("RATE_LIMIT_LOGIN_IP", "60/60")
+    RATE_LIMIT_LOGIN_EMAIL: str = os.getenv("RATE_LIMIT_LOGIN_EMAIL", "10/300")
+    RATE_LIMIT_SIGNUP_IP: str = os.getenv("RATE_LIMIT_SIGNUP_IP", "20/3600")
+    RATE_LIMIT_SIGNUP_EMAIL: str = os.getenv("RATE_LIMIT_SIGNUP_EMAIL", "")
+    RATE_LIMIT_RESET_IP: str = os.getenv("RATE_LIMIT_RESET_IP", "10/3600")
+    RATE_LIMIT_RESET_EMAIL: str = os.getenv("RATE_LIMIT_RESET_EMAIL", "3/3600")
+
+    @validator(
+        "RATE_LIMIT_LOGIN_IP",
+        "RATE_LIMIT_LOGIN_EMAIL",
+        "RATE_LIMIT_SIGNUP_IP",
+        "RATE_LIMIT_SIGNUP_EMAIL",
+        "RATE_LIMIT_RESET_IP",
+        "RATE_LIMIT_RESET_EMAIL",
+    )
+    def check_rate_limit(cls, v: str) -> str:
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+(?:\.\d*)?)\s*", v)
+        if v and (match is None or int(match[1]) < 1 or float(match[2]) <= 0):
+            raise ValueError('must be "<count>/<seconds>", e.g. "10/60", or empty')
+        return v
+
+    # Outgoing mail is queued and sent by background workers over kept-alive SMTP connections
+    EMAIL_WORKERS: int = int(os.getenv("EMAIL_WORKERS", 2))
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE", 20))
+    EMAIL_QUEUE_SIZE: int = int(os.getenv("EMAIL_QUEUE_SIZE", 10000))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+    EMAIL_RETRY_BACKOFF_SECONDS: float = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", 2))
 
 settings = Settings()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import crud
+from app.core.config import settings
+from app.crud.user import GET_CREDENTIALS
+from app.db.session import engine, replica_engine
+from app.deps.cash_service import CashService
+from app.utils import hasher
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness():
+    """Whether this worker should get traffic: warmed up and not draining."""
+
+    def __init__(self):
+        self.warmed_up = False
+        self.draining = False
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.warmed_up and not self.draining
+
+    def stats(self) -> Dict[str, Any]:
+        if self.draining:
+            status = "draining"
+        else:
+            status = "ready" if self.warmed_up else "warming_up"
+        return {
+            "status": status,
+            "warm_up_ms": {name: round(seconds * 1000, 1) for name, seconds in self.steps.items()},
+            "errors": self.errors,
+        }
+
+
+readiness = Readiness()
+
+
+async def fill_pool(engine: AsyncEngine) -> None:
+    """Open every pooled connection and run the hot statements on each."""
+
+    async def prime() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(GET_CREDENTIALS, {"email": ""})
+            await conn.execute(crud.user._get_stmt, {"id": 0})
+
+    await asyncio.gather(*(prime() for _ in range(settings.DB_POOL_SIZE)))
+
+
+# The steps import what they warm up, so importing the app does not pay for it
+async def warm_tokens() -> None:
+    from app.utils.keyring import ACCESS_TOKEN, keyring
+
+    claims = {"sub": "warm-up", "exp": int(time.time()) + 60, "typ": ACCESS_TOKEN}
+    keyring.decode(keyring.encode(claims), ACCESS_TOKEN)
+
+
+async def warm_templates() -> None:
+    if settings.EMAILS_ENABLED:
+        from app.utils.send_email import load_templates
+
+        load_templates()
+
+
+async def warm_up() -> None:
+    """
+    Pay this worker's first-request costs before it takes traffic: DB
+    connections and prepared statements, hashing processes, token crypto,
+    compiled email templates and the cash service session. A step that
+    fails is logged and reported by /ready but does not hold the worker
+    back; it only leaves that cost to the first requests.
+    """
+    steps: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "db_pool": lambda: fill_pool(engine),
+        "hashing": hasher.warm_up,
+        "tokens": warm_tokens,
+        "templates": warm_templates,
+        "cash_service": CashService.open,
+    }
+    if replica_engine is not None:
+        steps["db_replica_pool"] = lambda: fill_pool(replica_engine)
+    for name, step in steps.items():
+        started_at = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            logger.exception(f"warm-up step {name} failed")
+            readiness.errors[name] = str(e)
+        readiness.steps[name] = time.perf_counter() - started_at
+    readiness.warmed_up = True
+    logger.info(f"warmed up in {sum(readiness.steps.values()) * 1000:.0f} ms")
@@ -1,2 +1,5 @@
-from .base import CRUDBase
-from .user import user
\ No newline at end of file
+from .base import CRUDBase, StaleVersionError
+from .user import user
+from .outbox import outbox
+from .refresh_token import refresh_token
+from .revoked_token import revoked_token
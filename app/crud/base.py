@@ -1,18 +1,28 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any, AsyncIterator, Dict, Generic, List, Mapping, Optional, Sequence, Type, TypeVar, Union
+)
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
 from app.db.base_class import Base
+from app.db.snapshot import from_snapshot, to_snapshot
+from app.utils.cache import ReadThroughCache
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+class StaleVersionError(Exception):
+    """The row was changed by someone else since the client read it."""
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
-    def __init__(self, model: Type[ModelType]):
+    def __init__(self, model: Type[ModelType], cache: Optional[ReadThroughCache] = None):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
 
@@ -20,47 +30,179 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
 
         * `model`: A SQLAlchemy model class
         * `schema`: A Pydantic model (schema) class
+        * `cache`: Optional read-through cache for single-row lookups
         """
         self.model = model
+        self.cache = cache
+        self._get_stmt = select(model).where(model.id == bindparam("id"))
+
+    def cache_key(self, field: str, value: Any) -> str:
+        return f"{self.model.__tablename__}:{field}:{value}"
+
+    def cache_keys(self, db_obj: ModelType) -> List[str]:
+        """Every cache key `db_obj` may be stored under."""
+        return [self.cache_key("id", db_obj.id)]
+
+    async def invalidate(self, db_obj: ModelType) -> None:
+        if self.cache is not None:
+            await self.cache.invalidate(*self.cache_keys(db_obj))
+
+    async def _get_one(
+        self, db: AsyncSession, key: str, stmt: Select, params: Optional[Dict[str, Any]] = None
+    ) -> Optional[ModelType]:
+        if self.cache is None:
+            result = await db.execute(stmt, params)
+            return result.scalars().first()
+
+        async def load() -> Optional[Dict[str, Any]]:
+            result = await db.execute(stmt, params)
+            db_obj = result.scalars().first()
+            return None if db_obj is None else to_snapshot(db_obj)
+
+        snapshot = await self.cache.get_or_load(key, load)
+        if snapshot is None:
+            return None
+        return await db.merge(from_snapshot(self.model, snapshot), load=False)
 
-    def get(self, db: Session, *, id: Any) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+    async def get(self, db: AsyncSession, *, id: Any) -> Optional[ModelType]:
+        return await self._get_one(db, self.cache_key("id", id), self._get_stmt, {"id": id})
 
-    def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+    def _select(self, columns: Optional[Sequence[str]]) -> Select:
+        if columns is None:
+            return select(self.model)
+        return select(*(getattr(self.model, c) for c in columns))
+
+    async def get_multi(
+        self,
+        db: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        columns: Optional[Sequence[str]] = None,
     ) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+        """With `columns`, rows of just those columns instead of model instances."""
+        result = await db.execute(self._select(columns).offset(skip).limit(limit))
+        return result.scalars().all() if columns is None else result.all()
 
-    def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
+    async def get_multi_after(
+        self,
+        db: AsyncSession,
+        *,
+        after_id: Optional[Any] = None,
+        limit: int = 100,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[ModelType]:
+        """
+        Keyset page ordered by id: the next `limit` rows with an id above
+        `after_id`. With `columns`, rows of just those columns instead of
+        model instances.
+        """
+        stmt = self._select(columns).order_by(self.model.id).limit(limit)
+        if after_id is not None:
+            stmt = stmt.filter(self.model.id > after_id)
+        result = await db.execute(stmt)
+        return result.scalars().all() if columns is None else result.all()
+
+    async def get_rows(
+        self, db: AsyncSession, *, ids: Sequence[Any], columns: Sequence[str]
+    ) -> List[Mapping[str, Any]]:
+        """
+        `columns` of the rows with the given ids, as mappings, in one IN
+        query. Ids that do not exist are left out; order is not kept.
+        """
+        if not ids:
+            return []
+        stmt = select(*(getattr(self.model, c) for c in columns)).filter(
+            self.model.id.in_(ids)
+        )
+        result = await db.execute(stmt)
+        return result.mappings().all()
+
+    async def stream(
+        self, db: AsyncSession, *, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """
+        Yield every row as a mapping of `columns`, ordered by id.
+
+        Rows come from a server-side cursor `batch_size` at a time and no
+        ORM objects are built, so memory stays flat however big the table is.
+        """
+        stmt = select(*(getattr(self.model, c) for c in columns)).order_by(self.model.id)
+        result = await db.stream(stmt)
+        async for partition in result.partitions(batch_size):
+            for row in partition:
+                yield row._mapping
+
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data)  # type: ignore
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        await self.invalidate(db_obj)
         return db_obj
 
-    def update(
+    async def update(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         db_obj: ModelType,
         obj_in: Union[UpdateSchemaType, Dict[str, Any]]
-    ) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
+    ) -> Optional[ModelType]:
+        """
+        Write only the fields set in `obj_in` with a single UPDATE ... RETURNING,
+        and commit.
+
+        Returns None if the row no longer exists. Models with a `version`
+        column have it bumped by every update. If `obj_in` names a version,
+        the row is only updated while still at it, and StaleVersionError is
+        raised if it was not: someone else changed the row since the client
+        read it. Without one the write is unconditional, since `db_obj` may
+        well be a cached copy a few seconds old.
+        """
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
+        table = self.model.__table__
+        values = {
+            field: value for field, value in update_data.items()
+            if field in table.c and field not in ("id", "version")
+        }
+        if not values:
+            return db_obj
+        stmt = update(self.model).where(self.model.id == db_obj.id).values(**values)
+        versioned = "version" in table.c and update_data.get("version") is not None
+        if "version" in table.c:
+            stmt = stmt.values(version=self.model.version + 1)
+            if versioned:
+                stmt = stmt.where(self.model.version == update_data["version"])
+        stale_keys = self.cache_keys(db_obj)
+        # The returned row refreshes db_obj if it belongs to this session; one
+        # loaded elsewhere, e.g. from a read replica, is left as it was
+        result = await db.execute(
+            select(self.model)
+            .from_statement(stmt.returning(*table.c))
+            .execution_options(populate_existing=True)
+        )
+        updated = result.scalars().first()
+        conflict = False
+        if updated is None and versioned:
+            exists = await db.execute(select(self.model.id).where(self.model.id == db_obj.id))
+            conflict = exists.first() is not None
+        await db.commit()
+        if self.cache is not None and (updated is not None or conflict):
+            # Also on a conflict, so a retry does not start from a stale copy
+            await self.cache.invalidate(
+                *stale_keys, *(self.cache_keys(updated) if updated is not None else ())
+            )
+        if conflict:
+            raise StaleVersionError(f"{self.model.__tablename__} {db_obj.id} was changed meanwhile")
+        return updated
 
-    def remove(self, db: Session, *, id: int) -> ModelType:
-        obj = db.query(self.model).get(id)
-        db.delete(obj)
-        db.commit()
+    async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
+        obj = await db.get(self.model, id)
+        await db.delete(obj)
+        await db.commit()
+        await self.invalidate(obj)
         return obj
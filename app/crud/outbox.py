@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import CRUDBase
+from app.models.outbox import Outbox
+from app.schemas.outbox import OutboxCreate
+
+CREATE_CONSUMER_TOPIC = "cash.consumer.create"
+
+
+class CRUDOutbox(CRUDBase[Outbox, OutboxCreate, OutboxCreate]):
+    def add(self, db: AsyncSession, *, obj_in: OutboxCreate) -> Outbox:
+        """Stage an outbox row in the caller's transaction without committing."""
+        db_obj = Outbox(topic=obj_in.topic, user_id=obj_in.user_id, payload=obj_in.payload)
+        db.add(db_obj)
+        return db_obj
+
+    async def lease_batch(
+        self, db: AsyncSession, *, topic: str, limit: int, lease: timedelta
+    ) -> List[Outbox]:
+        """
+        Claim up to `limit` due rows by pushing their next attempt `lease`
+        into the future and counting the attempt, and commit. Counting it
+        here rather than on failure also bounds rows whose delivery keeps
+        crashing the dispatcher.
+
+        The rows are only locked for this one statement, SKIP LOCKED keeping
+        concurrent dispatchers off each other's rows; after the commit the
+        lease keeps them off instead, until the row is marked or it expires.
+        """
+        claimed = (
+            select(Outbox.id)
+            .filter(
+                Outbox.topic == topic,
+                Outbox.failed_at.is_(None),
+                Outbox.next_attempt_at <= func.now(),
+            )
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(Outbox)
+            .where(Outbox.id.in_(claimed.scalar_subquery()))
+            .values(attempts=Outbox.attempts + 1, next_attempt_at=func.now() + lease)
+            .returning(*Outbox.__table__.c)
+        )
+        result = await db.execute(
+            select(Outbox).from_statement(stmt).execution_options(populate_existing=True)
+        )
+        rows = sorted(result.scalars().all(), key=lambda row: row.id)
+        await db.commit()
+        return rows
+
+    async def mark_delivered(self, db: AsyncSession, *, ids: List[int]) -> None:
+        if ids:
+            await db.execute(delete(Outbox).where(Outbox.id.in_(ids)))
+
+    async def mark_failed(
+        self, db: AsyncSession, *, id: int, error: str, retry_in: timedelta
+    ) -> None:
+        await db.execute(
+            update(Outbox)
+            .where(Outbox.id == id)
+            .values(last_error=error[:1000], next_attempt_at=func.now() + retry_in)
+        )
+
+    async def mark_dead(self, db: AsyncSession, *, id: int, error: str) -> None:
+        """Stop retrying a row; it stays in the table with the error for inspection."""
+        await db.execute(
+            update(Outbox)
+            .where(Outbox.id == id)
+            .values(last_error=error[:1000], failed_at=func.now())
+        )
+
+    async def get_backlog(
+        self, db: AsyncSession, *, topic: str
+    ) -> Tuple[int, Optional[datetime], int]:
+        """
+        Return the number of rows still to deliver, the creation time of the
+        oldest of them and the number of rows given up on.
+        """
+        pending = Outbox.failed_at.is_(None)
+        result = await db.execute(
+            select(
+                func.count(Outbox.id).filter(pending),
+                func.min(Outbox.created_at).filter(pending),
+                func.count(Outbox.id).filter(Outbox.failed_at.isnot(None)),
+            ).filter(Outbox.topic == topic)
+        )
+        pending, oldest, dead = result.one()
+        return pending, oldest, dead
+
+
+outbox = CRUDOutbox(Outbox)
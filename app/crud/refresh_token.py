@@ -0,0 +1,102 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import CRUDBase
+from app.models.refresh_token import RefreshToken
+from app.schemas.token import RefreshTokenCreate
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class CRUDRefreshToken(CRUDBase[RefreshToken, RefreshTokenCreate, RefreshTokenCreate]):
+    def issue(self, db: AsyncSession, *, obj_in: RefreshTokenCreate) -> str:
+        """Stage a new refresh token without committing and return it in the clear."""
+        token = secrets.token_urlsafe(32)
+        db.add(RefreshToken(
+            user_id=obj_in.user_id,
+            token_hash=hash_token(token),
+            family_id=obj_in.family_id or uuid.uuid4().hex,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        ))
+        return token
+
+    async def rotate(self, db: AsyncSession, *, token: str) -> Optional[Tuple[int, str]]:
+        """
+        Spend `token` and return (user_id, family_id) to issue its successor
+        under, or None if it is unknown, expired or already spent.
+
+        A spent token coming back means it was stolen or replayed, so the
+        whole family is revoked and the legitimate holder has to log in again.
+        """
+        token_hash = hash_token(token)
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == token_hash,
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > func.now(),
+            )
+            .values(revoked_at=func.now())
+            .returning(RefreshToken.user_id, RefreshToken.family_id)
+            .execution_options(synchronize_session=False)
+        )
+        rotated = result.first()
+        if rotated is not None:
+            return rotated.user_id, rotated.family_id
+
+        result = await db.execute(
+            select(RefreshToken.family_id).where(
+                RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.isnot(None)
+            )
+        )
+        family_id = result.scalar()
+        if family_id is not None:
+            await self.revoke_family(db, family_id=family_id)
+        return None
+
+    async def revoke(self, db: AsyncSession, *, token: str, user_id: int) -> None:
+        """Revoke the family `token` belongs to, i.e. the login it came from."""
+        result = await db.execute(
+            select(RefreshToken.family_id).where(
+                RefreshToken.token_hash == hash_token(token), RefreshToken.user_id == user_id
+            )
+        )
+        family_id = result.scalar()
+        if family_id is not None:
+            await self.revoke_family(db, family_id=family_id)
+
+    async def revoke_family(self, db: AsyncSession, *, family_id: str) -> None:
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def revoke_user(self, db: AsyncSession, *, user_id: int) -> None:
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def prune(self, db: AsyncSession) -> None:
+        await db.execute(
+            delete(RefreshToken)
+            .where(RefreshToken.expires_at < func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+refresh_token = CRUDRefreshToken(RefreshToken)
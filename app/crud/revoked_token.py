@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud import CRUDBase
+from app.models.revoked_token import RevokedToken
+from app.schemas.token import TokenPayload
+
+
+class CRUDRevokedToken(CRUDBase[RevokedToken, TokenPayload, TokenPayload]):
+    async def add(
+        self, db: AsyncSession, *, jti: str, user_id: int, expires_at: datetime
+    ) -> None:
+        await db.execute(
+            pg_insert(RevokedToken)
+            .values(jti=jti, user_id=user_id, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        )
+
+    async def exists(self, db: AsyncSession, *, jti: str) -> bool:
+        result = await db.execute(select(RevokedToken.jti).where(RevokedToken.jti == jti))
+        return result.first() is not None
+
+    async def get_active_jtis(self, db: AsyncSession) -> List[str]:
+        result = await db.execute(
+            select(RevokedToken.jti).where(RevokedToken.expires_at > func.now())
+        )
+        return result.scalars().all()
+
+    async def prune(self, db: AsyncSession) -> None:
+        await db.execute(
+            delete(RevokedToken)
+            .where(RevokedToken.expires_at < func.now())
+            .execution_options(synchronize_session=False)
+        )
+
+
+revoked_token = CRUDRevokedToken(RevokedToken)
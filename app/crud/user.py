@@ -1,44 +1,206 @@
-from typing import Any, Dict, Optional, Union
-from passlib.context import CryptContext
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
 
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from app.utils import get_password_hash
-from app.crud import CRUDBase
+from app.core.config import settings
+from app.utils import hasher
+from app.utils.cache import build_cache
+from app.utils.token_cache import token_cache
+from app.crud import CRUDBase, StaleVersionError
+from app.crud.outbox import CREATE_CONSUMER_TOPIC
+from app.crud.refresh_token import refresh_token
+from app.models.outbox import Outbox
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hot-path statements are built once and only bound per call; their compiled
+# form is then reused from the engine's statement cache
+GET_WITH_EMAIL = select(User).where(User.email == bindparam("email"))
+GET_CREDENTIALS = select(User.id, User.hashed_password, User.is_active).where(
+    User.email == bindparam("email")
+)
 
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
-    def get_with_email(self, db: Session, *, email: str) -> Optional[User]:
-        return db.query(User).filter(User.email == email).first()
-
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
-        db_obj = User(
-            email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
-            nickname=obj_in.nickname,
-            is_superuser=obj_in.is_superuser,
+    def cache_keys(self, db_obj: User) -> List[str]:
+        return [self.cache_key("id", db_obj.id), self.cache_key("email", db_obj.email)]
+
+    async def get_with_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
+        email = email.lower()
+        return await self._get_one(
+            db, self.cache_key("email", email), GET_WITH_EMAIL, {"email": email}
+        )
+
+    async def get_credentials(self, db: AsyncSession, *, email: str) -> Optional[Row]:
+        """
+        (id, hashed_password, is_active) for `email`, read straight from the
+        covering email index without building a User.
+        """
+        result = await db.execute(GET_CREDENTIALS, {"email": email.lower()})
+        return result.first()
+
+    async def create(
+        self, db: AsyncSession, *, obj_in: UserCreate, provision_consumer: bool = True
+    ) -> Optional[User]:
+        """
+        Insert the user with a single INSERT ... ON CONFLICT (email) DO
+        NOTHING RETURNING, and commit. Returns None if the email is taken,
+        including by a concurrent signup.
+        """
+        # Python-side defaults are not applied to an INSERT inside a CTE, so
+        # every column without a server default is given
+        new_user = (
+            pg_insert(User)
+            .values(
+                email=obj_in.email,
+                hashed_password=await hasher.hash(obj_in.password),
+                nickname=obj_in.nickname,
+                is_active=True,
+                is_superuser=obj_in.is_superuser,
+            )
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(*User.__table__.c)
         )
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        if provision_consumer:
+            # The cash consumer is created by the outbox dispatcher; its row is
+            # inserted by the same statement so neither exists without the other.
+            # Joining on it is what makes the outbox CTE part of the statement.
+            new_user = new_user.cte("new_user")
+            new_outbox = insert(Outbox).from_select(
+                ["topic", "user_id", "payload", "attempts"],
+                select(
+                    literal(CREATE_CONSUMER_TOPIC),
+                    new_user.c.id,
+                    literal({"cash": 0}, Outbox.payload.type),
+                    literal(0),
+                ),
+            ).returning(Outbox.user_id).cte("new_outbox")
+            user_alias = aliased(User, new_user)
+            stmt = select(user_alias).join(new_outbox, new_outbox.c.user_id == user_alias.id)
+        else:
+            stmt = select(User).from_statement(new_user)
+        result = await db.execute(stmt)
+        db_obj = result.scalars().first()
+        await db.commit()
+        if db_obj is not None:
+            await self.invalidate(db_obj)
         return db_obj
 
-    def update(
-        self, db: Session, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
-    ) -> User:
+    async def update(
+        self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]
+    ) -> Optional[User]:
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
         if update_data.get("password", False):
             if update_data["password"]:
-                hashed_password = get_password_hash(update_data["password"])
+                hashed_password = await hasher.hash(update_data["password"])
                 del update_data["password"]
                 update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+        user_id = db_obj.id
+        try:
+            db_obj = await super().update(db, db_obj=db_obj, obj_in=update_data)
+        except StaleVersionError:
+            # So a retry does not start from a stale snapshot
+            token_cache.invalidate_user(user_id)
+            raise
+        if db_obj is None:
+            return None
+        token_cache.invalidate_user(user_id)
+        if "hashed_password" in update_data or update_data.get("is_active") is False:
+            # Existing logins end once their access token expires
+            await refresh_token.revoke_user(db, user_id=db_obj.id)
+            await db.commit()
+        return db_obj
+
+    async def rehash_password(
+        self, db: AsyncSession, *, id: int, old_hash: str, new_hash: str
+    ) -> bool:
+        """
+        Swap in a stronger hash of the same password, unless the password
+        changed meanwhile. Sessions stay valid, since the password did not change.
+        """
+        result = await db.execute(
+            update(User)
+            .where(User.id == id, User.hashed_password == old_hash)
+            .values(hashed_password=new_hash)
+            .returning(User.email)
+        )
+        email = result.scalar()
+        await db.commit()
+        if email is not None and self.cache is not None:
+            await self.cache.invalidate(self.cache_key("id", id), self.cache_key("email", email))
+        return email is not None
+
+    async def get_batch(
+        self,
+        db: AsyncSession,
+        *,
+        ids: Sequence[int],
+        emails: Sequence[str],
+        columns: Sequence[str],
+    ) -> List[Mapping[str, Any]]:
+        """
+        `columns` (plus id and email, to match on) of every user in `ids` or
+        `emails`, with one query over the id and email indexes.
+        """
+        if not ids and not emails:
+            return []
+        columns = ["id", "email", *(c for c in columns if c not in ("id", "email"))]
+        result = await db.execute(
+            select(*(getattr(User, c) for c in columns)).filter(
+                or_(User.id.in_(ids), User.email.in_([email.lower() for email in emails]))
+            )
+        )
+        return result.mappings().all()
+
+    async def get_existing_emails(self, db: AsyncSession, *, emails: Iterable[str]) -> Set[str]:
+        emails = [email.lower() for email in emails]
+        result = await db.execute(select(User.email).filter(User.email.in_(emails)))
+        return set(result.scalars().all())
+
+    async def bulk_insert(
+        self, db: AsyncSession, *, rows: List[Dict[str, Any]]
+    ) -> List[Tuple[int, str]]:
+        """
+        Insert already-hashed user rows with one multi-row INSERT and queue
+        their cash consumers, without committing.
+
+        Rows whose email is taken are skipped; returns (id, email) of the
+        rows that were inserted.
+        """
+        if not rows:
+            return []
+        result = await db.execute(
+            pg_insert(User)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=[User.email])
+            .returning(User.id, User.email)
+        )
+        created = result.all()
+        if created:
+            await db.execute(insert(Outbox).values([
+                {"topic": CREATE_CONSUMER_TOPIC, "user_id": id, "payload": {"cash": 0}, "attempts": 0}
+                for id, _ in created
+            ]))
+        return created
+
+    async def remove(self, db: AsyncSession, *, id: int) -> User:
+        obj = await super().remove(db, id=id)
+        token_cache.invalidate_user(id)
+        return obj
 
-user = CRUDUser(User)
+user = CRUDUser(
+    User,
+    cache=build_cache(
+        settings.USER_CACHE_BACKEND,
+        url=settings.USER_CACHE_URL,
+        max_size=settings.USER_CACHE_SIZE,
+        ttl=settings.USER_CACHE_TTL_SECONDS,
+    ),
+)
@@ -1,2 +1,5 @@
 from app.db.base_class import Base
-from app.models.user import User  
\ No newline at end of file
+from app.models.user import User  
+from app.models.outbox import Outbox
+from app.models.refresh_token import RefreshToken
+from app.models.revoked_token import RevokedToken
\ No newline at end of file
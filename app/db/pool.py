@@ -0,0 +1,57 @@
+import time
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.utils import metrics
+
+POOL_CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool, including connecting",
+)
+POOL_CHECKOUT_ERRORS = metrics.counter(
+    "db_pool_checkout_errors", "Checkouts that timed out or failed to connect"
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The engine's default pool, timing how long each checkout waits."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            POOL_CHECKOUT_ERRORS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started_at)
+
+
+def install_idle_pre_ping(engine: Any, idle_seconds: float) -> None:
+    """
+    Ping only connections that sat in the pool for more than `idle_seconds`.
+
+    Busy connections are the ones least likely to have been dropped, so
+    this saves the round trip `pool_pre_ping` adds to every checkout while
+    still catching connections the server or a proxy timed out.
+    """
+    dialect = engine.dialect
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record) -> None:
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        # On a disconnect the pool discards the connection and retries with a fresh one
+        try:
+            alive = dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            raise exc.DisconnectionError() from e
+        if not alive:
+            raise exc.DisconnectionError()
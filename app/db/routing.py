@@ -0,0 +1,70 @@
+import time
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.db.session import replica_engine
+from app.utils.cache import CacheBackend, FakeKeyValueClient, KeyValueCacheBackend, LocalCacheBackend
+
+
+class PrimaryPins():
+    """
+    Users who wrote within the last `seconds`, whose reads stay on the
+    primary until a replica has caught up with their write.
+
+    Keyed by user id rather than by anything the client sends back, so it
+    holds for bearer-token clients too, and set only by endpoints that
+    write. Shared between workers when the backend is.
+    """
+
+    def __init__(self, backend: CacheBackend, seconds: float):
+        self.backend = backend
+        self.seconds = seconds
+
+    @staticmethod
+    def key(user_id: Any) -> str:
+        return f"primary_pin:{user_id}"
+
+    async def pin(self, *user_ids: Any) -> None:
+        until = time.time() + self.seconds
+        for user_id in user_ids:
+            await self.backend.set(self.key(user_id), {"until": until})
+
+    async def is_pinned(self, user_id: Any) -> bool:
+        value = await self.backend.get(self.key(user_id))
+        return value is not None and value["until"] > time.time()
+
+
+def build_primary_pins(
+    backend: str, *, url: Optional[str], max_size: int, seconds: float
+) -> Optional[PrimaryPins]:
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return PrimaryPins(LocalCacheBackend(max_size=max_size, ttl=seconds), seconds)
+    if backend == "fake":
+        return PrimaryPins(KeyValueCacheBackend(FakeKeyValueClient(), ttl=seconds), seconds)
+    if backend == "redis":
+        # Optional dependency, only needed when the pins are shared between workers
+        from redis import asyncio as aioredis
+
+        return PrimaryPins(KeyValueCacheBackend(aioredis.from_url(url), ttl=seconds), seconds)
+    raise ValueError(f"Unknown read-your-writes backend: {backend}")
+
+
+# Nothing to pin without a replica to read from
+primary_pins = None if replica_engine is None else build_primary_pins(
+    settings.DB_READ_YOUR_WRITES_BACKEND,
+    url=settings.DB_READ_YOUR_WRITES_URL,
+    max_size=settings.DB_READ_YOUR_WRITES_MAX_USERS,
+    seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+)
+
+
+async def pin_to_primary(*user_ids: Any) -> None:
+    """Call after a write, with the users whose reads should see it."""
+    if primary_pins is not None:
+        await primary_pins.pin(*user_ids)
+
+
+async def reads_from_primary(user_id: Any) -> bool:
+    return primary_pins is not None and await primary_pins.is_pinned(user_id)
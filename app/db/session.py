@@ -1,7 +1,45 @@
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from .pool import TimedQueuePool, install_idle_pre_ping
+
+
+def build_engine(url: str) -> AsyncEngine:
+    if settings.DB_POOL_PRE_PING not in ("always", "idle", "never"):
+        raise ValueError(f"Unknown DB_POOL_PRE_PING strategy: {settings.DB_POOL_PRE_PING}")
+    engine = create_async_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING == "always",
+    )
+    if settings.DB_POOL_PRE_PING == "idle":
+        install_idle_pre_ping(engine.sync_engine, settings.DB_POOL_PRE_PING_IDLE_SECONDS)
+    return engine
+
+
+def build_sessionmaker(engine: AsyncEngine) -> sessionmaker:
+    return sessionmaker(
+        engine,
+        class_=AsyncSession,
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+engine = build_engine(settings.ASYNC_SQLALCHEMY_DATABASE_URI)
+SessionLocal = build_sessionmaker(engine)
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Without a replica, reads share the primary engine
+replica_engine: Optional[AsyncEngine] = None
+ReadSessionLocal = SessionLocal
+if settings.ASYNC_SQLALCHEMY_REPLICA_URI:
+    replica_engine = build_engine(settings.ASYNC_SQLALCHEMY_REPLICA_URI)
+    ReadSessionLocal = build_sessionmaker(replica_engine)
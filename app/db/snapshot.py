@@ -0,0 +1,25 @@
+from typing import Any, Dict, Iterable, Type
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.db.base_class import Base
+
+
+def to_snapshot(obj: Base, exclude: Iterable[str] = ()) -> Dict[str, Any]:
+    """Copy the column values of a loaded row into a plain dict."""
+    return {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns
+        if column.key not in exclude
+    }
+
+
+def from_snapshot(model: Type[Base], snapshot: Dict[str, Any]) -> Base:
+    """
+    Rebuild a detached instance from a snapshot without touching the database.
+
+    Merge the result into a session with `load=False` to use it there.
+    """
+    obj = model(**snapshot)
+    make_transient_to_detached(obj)
+    return obj
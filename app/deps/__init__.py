@@ -1,8 +1,9 @@
-from .get_db import get_db
+from .get_db import get_db, get_read_db
 from .get_user import (
     get_current_user,
     get_current_active_user,
     get_current_active_superuser,
     get_active_user_with_reset_token,
+    get_token_payload,
 )
 from .cash_service import CashService
\ No newline at end of file
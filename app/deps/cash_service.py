@@ -1,17 +1,122 @@
+from typing import TYPE_CHECKING, Optional
 from fastapi.exceptions import HTTPException
 
 from app.core.config import settings
+from app.utils import metrics
+from app.utils.circuit_breaker import CircuitBreaker
 from app import schemas
 
-import aiohttp
+import asyncio
+import random
+import time
+
+# Statuses where the cash service did not act on the request, so retrying is safe
+RETRYABLE_STATUSES = {502, 503, 504}
+
+if TYPE_CHECKING:
+    import aiohttp
+
+CASH_SERVICE_SECONDS = metrics.histogram(
+    "cash_service_request_seconds",
+    "Cash service calls including retries, by the status they ended with",
+    ["status"],
+)
+CASH_SERVICE_RETRIES = metrics.counter("cash_service_retries", "Cash service calls retried")
 
 
 class CashService():
-    async def create_consumer(self, token):
+    session: Optional["aiohttp.ClientSession"] = None
+    breaker = CircuitBreaker(
+        failure_threshold=settings.CASH_SERVICE_BREAKER_THRESHOLD,
+        reset_timeout=settings.CASH_SERVICE_BREAKER_RESET_SECONDS,
+    )
+
+    @classmethod
+    async def open(cls) -> "aiohttp.ClientSession":
+        # Imported here rather than with the app, it is a good part of its import time
+        import aiohttp
+
+        if cls.session is None or cls.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.CASH_SERVICE_MAX_CONNECTIONS,
+                limit_per_host=settings.CASH_SERVICE_MAX_CONNECTIONS,
+                keepalive_timeout=settings.CASH_SERVICE_KEEPALIVE_SECONDS,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(
+                connect=settings.CASH_SERVICE_CONNECT_TIMEOUT,
+                sock_read=settings.CASH_SERVICE_READ_TIMEOUT,
+            )
+            cls.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return cls.session
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.session is not None:
+            await cls.session.close()
+            cls.session = None
+
+    async def create_consumer(self, token, consumer_in: Optional[schemas.ConsumerCreate] = None):
+        started_at = time.perf_counter()
+        status = 200
+        try:
+            await self._create_consumer(token, consumer_in or schemas.ConsumerCreate(cash=0))
+        except HTTPException as e:
+            status = e.status_code
+            raise
+        finally:
+            CASH_SERVICE_SECONDS.observe(time.perf_counter() - started_at, status=status)
+
+    async def _create_consumer(self, token, consumer_in: schemas.ConsumerCreate):
+        admitted = self.breaker.allow()
+        if admitted is None:
+            raise HTTPException(status_code=503, detail="Cash service unavailable")
+        try:
+            await self._post_consumer(token, consumer_in)
+        finally:
+            # Also when cancelled or failing in a way that records no outcome,
+            # which would otherwise leave a half-open breaker closed to all calls
+            if admitted == CircuitBreaker.HALF_OPEN:
+                self.breaker.release()
+
+    async def _post_consumer(self, token, consumer_in: schemas.ConsumerCreate):
+        import aiohttp
+
+        session = await self.open()
         headers={"Authorization": f"Bearer {token}"}
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(f"{settings.CASH_SERVICE_BASE_URL}/api/v1/cash/consumers",
-                json=schemas.ConsumerCreate(cash=0).dict()) as resp:
-                if resp.status != 200:
-                    raise HTTPException(status_code=resp.status, detail=await resp.text())
+        attempt = 0
+        while True:
+            try:
+                async with session.post(f"{settings.CASH_SERVICE_BASE_URL}/api/v1/cash/consumers",
+                    headers=headers, json=consumer_in.dict()) as resp:
+                    if resp.status in RETRYABLE_STATUSES and attempt < settings.CASH_SERVICE_RETRIES:
+                        attempt += 1
+                        await self._backoff(attempt)
+                        continue
+                    if resp.status >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    if resp.status != 200:
+                        raise HTTPException(status_code=resp.status, detail=await resp.text())
+                    return
+            except aiohttp.ClientConnectorError:
+                # The request never reached the cash service
+                if attempt < settings.CASH_SERVICE_RETRIES:
+                    attempt += 1
+                    await self._backoff(attempt)
+                    continue
+                self.breaker.record_failure()
+                raise HTTPException(status_code=503, detail="Cash service unavailable")
+            except asyncio.TimeoutError:
+                self.breaker.record_failure()
+                raise HTTPException(status_code=504, detail="Cash service timed out")
+            except aiohttp.ClientError:
+                self.breaker.record_failure()
+                raise HTTPException(status_code=502, detail="Cash service request failed")
 
+    async def _backoff(self, attempt: int) -> None:
+        CASH_SERVICE_RETRIES.inc()
+        # Full jitter: sleep a random amount up to the exponential delay
+        delay = settings.CASH_SERVICE_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        await asyncio.sleep(random.uniform(0, delay))
@@ -1,12 +1,46 @@
-from typing import Generator
+from typing import Any, AsyncGenerator, Optional
 
-from app.db.session import SessionLocal
+from fastapi import Depends, Request
+from fastapi.security.utils import get_authorization_scheme_param
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.routing import reads_from_primary
+from app.db.session import ReadSessionLocal, SessionLocal
 
-def get_db() -> Generator:
-    try:
-        db = SessionLocal()
+
+async def get_db() -> AsyncGenerator:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
+
+def token_subject(request: Request) -> Optional[Any]:
+    """
+    The `sub` of the request's bearer token, unverified: it only picks a
+    database, the token itself is still checked by get_current_user.
+    """
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except jwt.JWTError:
+        return None
+
+
+async def get_read_db(
+    request: Request, db: AsyncSession = Depends(get_db)
+) -> AsyncGenerator:
+    """
+    A session on the read replica, or on the primary when there is none or
+    the user wrote recently. The primary session is only connected if used.
+    """
+    if ReadSessionLocal is SessionLocal:
+        yield db
+        return
+    user_id = token_subject(request)
+    if user_id is not None and await reads_from_primary(user_id):
+        yield db
+        return
+    async with ReadSessionLocal() as read_db:
+        yield read_db
@@ -2,37 +2,57 @@ from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models, schemas
 from app.core.config import settings
-from .get_db import get_db
+from app.db.snapshot import from_snapshot, to_snapshot
+from app.utils.keyring import ACCESS_TOKEN, PASSWORD_RESET_TOKEN, keyring
+from app.utils.token_cache import token_cache
+from app.workers.revocation import revocation_index
+from .get_db import get_db, get_read_db
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl = settings.TOKEN_URL
 )
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> models.User:
+def decode_token(token: str) -> schemas.TokenPayload:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ENCRYPT_ALGORITHM]
-        )
-        token_data = schemas.TokenPayload(**payload)
+        return schemas.TokenPayload(**keyring.decode(token, ACCESS_TOKEN))
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=403,
             detail="Could not validate credentials",
         )
-    user = crud.user.get(db, id=token_data.sub)
+
+
+async def get_token_payload(token: str = Depends(reusable_oauth2)) -> schemas.TokenPayload:
+    return decode_token(token)
+
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_read_db), token: str = Depends(reusable_oauth2)
+) -> models.User:
+    cached = token_cache.get(token)
+    token_data = cached[0] if cached is not None else decode_token(token)
+    if await revocation_index.is_revoked(db, token_data.jti):
+        raise HTTPException(status_code=403, detail="Token has been revoked")
+    if cached is not None:
+        return await db.merge(from_snapshot(models.User, cached[1]), load=False)
+    user = await crud.user.get(db, id=token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    token_cache.set(
+        token,
+        token_data,
+        to_snapshot(user, exclude=("hashed_password",)),
+        exp=token_data.exp,
+    )
     return user
 
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     if not current_user.is_active:
@@ -40,7 +60,7 @@ def get_current_active_user(
     return current_user
 
 
-def get_current_active_superuser(
+async def get_current_active_superuser(
     current_user: models.User = Depends(get_current_user),
 ) -> models.User:
     if not current_user.is_superuser:
@@ -50,18 +70,18 @@ def get_current_active_superuser(
     return current_user
 
 
-def get_active_user_with_reset_token(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
+async def get_active_user_with_reset_token(
+    db: AsyncSession = Depends(get_db), token: str = Depends(reusable_oauth2)
 ) -> models.User:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        email = payload["email"]
-    except (jwt.JWTError, ValidationError):
+        payload = keyring.decode(token, PASSWORD_RESET_TOKEN)
+        email = payload["sub"]
+    except (jwt.JWTError, KeyError):
         raise HTTPException(
             status_code=403,
             detail="Could not validate credentials",
         )
-    user = crud.user.get_with_email(db, email=email)
+    user = await crud.user.get_with_email(db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
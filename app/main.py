@@ -1,8 +1,16 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api import metrics, ready, well_known
 from app.api.v1 import api_router
 from app.core.config import settings
+from app.core.warmup import warm_up
+from app.deps import CashService
+from app.utils import email_queue, hasher
+from app.db.session import engine, replica_engine
+from app.utils.metrics import MetricsMiddleware, install_statement_counter
+from app.utils.profiling import ProfilingMiddleware, install_query_hooks
+from app.workers import outbox_dispatcher, revocation_index
 
 app = FastAPI(
     title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json"
@@ -19,4 +27,87 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+if settings.PROFILING_ENABLED:
+    if not settings.PROFILING_SECRET:
+        raise RuntimeError("PROFILING_ENABLED needs PROFILING_SECRET to verify requests with")
+    install_query_hooks(engine.sync_engine)
+    if replica_engine is not None:
+        install_query_hooks(replica_engine.sync_engine)
+    app.add_middleware(
+        ProfilingMiddleware,
+        secret=settings.PROFILING_SECRET,
+        max_age=settings.PROFILING_MAX_AGE_SECONDS,
+        output_dir=settings.PROFILING_OUTPUT_DIR,
+    )
+
+if settings.METRICS_ENABLED:
+    install_statement_counter(engine.sync_engine)
+    if replica_engine is not None:
+        install_statement_counter(replica_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(well_known.router)
+app.include_router(ready.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
+
+
+@app.on_event("startup")
+def load_jwt_keys() -> None:
+    from app.utils.keyring import keyring
+
+    keyring.load()
+
+
+@app.on_event("startup")
+async def open_http_clients() -> None:
+    await CashService.open()
+
+
+@app.on_event("startup")
+async def start_revocation_index() -> None:
+    await revocation_index.start()
+
+
+@app.on_event("startup")
+async def start_outbox_dispatcher() -> None:
+    if settings.OUTBOX_DISPATCHER_ENABLED:
+        await outbox_dispatcher.start()
+
+
+@app.on_event("startup")
+async def start_email_queue() -> None:
+    if settings.EMAILS_ENABLED:
+        await email_queue.start()
+
+
+@app.on_event("startup")
+async def warm_up_worker() -> None:
+    # Last, so a worker is only marked ready once everything above has started
+    await warm_up()
+
+
+@app.on_event("shutdown")
+async def stop_outbox_dispatcher() -> None:
+    await outbox_dispatcher.stop()
+
+
+@app.on_event("shutdown")
+async def stop_revocation_index() -> None:
+    await revocation_index.stop()
+
+
+@app.on_event("shutdown")
+async def stop_email_queue() -> None:
+    await email_queue.stop()
+
+
+@app.on_event("shutdown")
+async def close_http_clients() -> None:
+    await CashService.close()
+
+
+@app.on_event("shutdown")
+def shutdown_hasher() -> None:
+    hasher.shutdown()
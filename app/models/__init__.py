@@ -1 +1,4 @@
 from .user import User
+from .outbox import Outbox
+from .refresh_token import RefreshToken
+from .revoked_token import RevokedToken
@@ -0,0 +1,18 @@
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Integer, String, func
+
+from app.db.base_class import Base
+
+
+class Outbox(Base):
+    id = Column(BigInteger, primary_key=True)
+    topic = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    # Set once delivery is given up on, see OutboxDispatcher
+    failed_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    next_attempt_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), index=True
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String, func
+
+from app.db.base_class import Base
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_token"
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=False, index=True)
+    # sha256 of the token; the token itself is only ever shown to the client
+    token_hash = Column(String, nullable=False, unique=True, index=True)
+    # Every token rotated out of the same login shares a family
+    family_id = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True))
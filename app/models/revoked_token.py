@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+
+from app.db.base_class import Base
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_token"
+
+    id = Column(BigInteger, primary_key=True)
+    jti = Column(String, nullable=False, unique=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    # Access tokens are short-lived, so a row is only needed until `expires_at`
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
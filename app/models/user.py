@@ -1,14 +1,26 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from app.db.base_class import Base
 
 class User(Base):
+    __table_args__ = (
+        # Covers the login lookup so it is answered from the index alone
+        Index(
+            "ix_user_email",
+            "email",
+            unique=True,
+            postgresql_include=["id", "hashed_password", "is_active"],
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     nickname = Column(String, index=True)
-    email = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean(), default=True)
     is_superuser = Column(Boolean(), default=False)
+    # Bumped by every update, which only applies to the version it was read at
+    version = Column(Integer, nullable=False, server_default="1")
@@ -1,4 +1,8 @@
 from .msg import Msg
-from .token import Token, TokenPayload
+from .token import RefreshTokenCreate, Token, TokenPayload, TokenRefresh
 from .user import User, UserCreate, UserInDB, UserUpdate
-from .consumer import ConsumerCreate
\ No newline at end of file
+from .consumer import ConsumerCreate
+from .outbox import OutboxCreate
+from .user_import import UserImportError, UserImportResult
+from .introspection import TokenIntrospection, TokenIntrospectionRequest, TokenIntrospectionResponse
+from .user_batch import UserBatchItem, UserBatchRequest, UserBatchResponse
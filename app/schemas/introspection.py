@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from .user import User
+
+
+class TokenIntrospectionRequest(BaseModel):
+    tokens: List[str]
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[int] = None
+    exp: Optional[int] = None
+    jti: Optional[str] = None
+    user: Optional[User] = None
+
+
+class TokenIntrospectionResponse(BaseModel):
+    results: List[TokenIntrospection]
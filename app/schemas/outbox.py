@@ -0,0 +1,9 @@
+from typing import Any, Dict
+
+from pydantic import BaseModel
+
+
+class OutboxCreate(BaseModel):
+    topic: str
+    user_id: int
+    payload: Dict[str, Any] = {}
@@ -6,7 +6,20 @@ from pydantic import BaseModel
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
 
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
+    jti: Optional[str] = None
+    exp: Optional[int] = None
+
+
+class RefreshTokenCreate(BaseModel):
+    user_id: int
+    family_id: Optional[str] = None
+
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
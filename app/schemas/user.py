@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, validator
 
 
 # Shared properties
@@ -10,6 +10,11 @@ class UserBase(BaseModel):
     is_superuser: bool = False
     nickname: Optional[str] = None
 
+    @validator("email")
+    def normalize_email(cls, v: Optional[str]) -> Optional[str]:
+        # Emails are stored lower-cased so lookups can use a plain equality
+        return v.lower() if v else v
+
 
 # Properties to receive via API on creation
 class UserCreate(UserBase):
@@ -20,10 +25,13 @@ class UserCreate(UserBase):
 # Properties to receive via API on update
 class UserUpdate(UserBase):
     password: Optional[str] = None
+    # The version the change was based on; a newer one in the database is a conflict
+    version: Optional[int] = None
 
 
 class UserInDBBase(UserBase):
     id: Optional[int] = None
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
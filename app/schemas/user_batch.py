@@ -0,0 +1,37 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, EmailStr, validator
+
+# Columns a batch lookup may project; never the password hash
+USER_BATCH_FIELDS = ("id", "email", "nickname", "is_active", "is_superuser")
+
+
+class UserBatchRequest(BaseModel):
+    ids: List[int] = []
+    emails: List[EmailStr] = []
+    fields: Optional[List[str]] = None
+
+    @validator("emails", each_item=True)
+    def normalize_email(cls, v: str) -> str:
+        return v.lower()
+
+    @validator("fields")
+    def check_fields(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        unknown = set(v or ()) - set(USER_BATCH_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown fields {sorted(unknown)}, expected some of {USER_BATCH_FIELDS}")
+        return v
+
+
+class UserBatchItem(BaseModel):
+    id: Optional[int] = None
+    email: Optional[EmailStr] = None
+    nickname: Optional[str] = None
+    is_active: Optional[bool] = None
+    is_superuser: Optional[bool] = None
+
+
+class UserBatchResponse(BaseModel):
+    # Same order and length as the request lists; null where nothing matched
+    ids: List[Optional[UserBatchItem]] = []
+    emails: List[Optional[UserBatchItem]] = []
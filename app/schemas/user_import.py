@@ -0,0 +1,15 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class UserImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+
+class UserImportResult(BaseModel):
+    created: int = 0
+    failed: int = 0
+    errors: List[UserImportError] = []
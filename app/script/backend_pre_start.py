@@ -1,7 +1,10 @@
+import asyncio
 import logging
 
 from tenacity import after_log, before_log, retry, stop_after_attempt, wait_fixed
 
+from sqlalchemy import text
+
 from app.db.session import SessionLocal
 
 logging.basicConfig(level=logging.INFO)
@@ -17,11 +20,11 @@ wait_seconds = 1
     before=before_log(logger, logging.INFO),
     after=after_log(logger, logging.WARN),
 )
-def init() -> None:
+async def init() -> None:
     try:
-        db = SessionLocal()
-        # Try to create session to check if DB is awake
-        db.execute("SELECT 1")
+        async with SessionLocal() as db:
+            # Try to create session to check if DB is awake
+            await db.execute(text("SELECT 1"))
     except Exception as e:
         logger.error(e)
         raise e
@@ -29,7 +32,7 @@ def init() -> None:
 
 def main() -> None:
     logger.info("Initializing service")
-    init()
+    asyncio.run(init())
     logger.info("Service finished initializing")
 
 
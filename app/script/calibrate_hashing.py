@@ -0,0 +1,103 @@
+"""
+Measure password hashing cost on this machine and pick the strongest work
+factor that still fits a latency budget.
+
+    python -m app.script.calibrate_hashing --target-ms 250 [--scheme argon2]
+
+Run it on the deployment hardware, not a laptop. Prints the measurements,
+the settings to use and the login throughput they leave a worker with,
+since every login pays for one verify in the hashing pool.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from passlib.hash import argon2, bcrypt
+
+PASSWORD = "calibration-password"
+
+
+def measure(hash_fn: Callable[[str], str], samples: int) -> float:
+    """Median milliseconds to hash one password."""
+    hash_fn(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        hash_fn(PASSWORD)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(args: argparse.Namespace) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    for rounds in range(args.min_cost or 10, 20):
+        ms = measure(bcrypt.using(rounds=rounds).hash, args.samples)
+        results.append({"BCRYPT_ROUNDS": rounds, "ms": round(ms, 1)})
+        # Each extra round doubles the cost, so the next one would be over budget
+        if ms * 2 > args.target_ms:
+            break
+    return {"scheme": "bcrypt", "measurements": results}
+
+
+def calibrate_argon2(args: argparse.Namespace) -> Dict[str, Any]:
+    if not argon2.has_backend():
+        raise SystemExit("argon2 needs the argon2-cffi package")
+    results: List[Dict[str, Any]] = []
+    for time_cost in range(args.min_cost or 1, 33):
+        handler = argon2.using(
+            type="ID",
+            rounds=time_cost,
+            memory_cost=args.memory_kib,
+            parallelism=args.parallelism,
+        )
+        ms = measure(handler.hash, args.samples)
+        results.append({
+            "ARGON2_TIME_COST": time_cost,
+            "ARGON2_MEMORY_KIB": args.memory_kib,
+            "ARGON2_PARALLELISM": args.parallelism,
+            "ms": round(ms, 1),
+        })
+        if ms > args.target_ms:
+            break
+    return {"scheme": "argon2", "measurements": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pick a password hashing cost for a latency budget")
+    parser.add_argument("--scheme", choices=("bcrypt", "argon2"), default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250, help="budget for one hash")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per cost")
+    parser.add_argument("--min-cost", type=int, help="lowest rounds / time cost to try")
+    parser.add_argument("--memory-kib", type=int, default=65536, help="argon2 memory per hash")
+    parser.add_argument("--parallelism", type=int, default=1, help="argon2 lanes per hash")
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=int(os.getenv("HASHING_POOL_SIZE", os.cpu_count() or 1)),
+        help="hashing processes per worker, for the throughput estimate",
+    )
+    args = parser.parse_args()
+
+    report = calibrate_bcrypt(args) if args.scheme == "bcrypt" else calibrate_argon2(args)
+    within = [m for m in report["measurements"] if m["ms"] <= args.target_ms]
+    if within:
+        chosen = within[-1]
+        report["settings"] = {
+            "PASSWORD_SCHEMES": "argon2,bcrypt" if args.scheme == "argon2" else "bcrypt",
+            **{k: v for k, v in chosen.items() if k != "ms"},
+        }
+        report["ms_per_hash"] = chosen["ms"]
+        report["logins_per_second"] = round(args.pool_size * 1000 / chosen["ms"], 1)
+    else:
+        report["settings"] = None
+        report["note"] = "even the cheapest cost tried is over budget"
+    report["target_ms"] = args.target_ms
+    report["pool_size"] = args.pool_size
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
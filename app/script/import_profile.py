@@ -0,0 +1,86 @@
+"""
+Report how long importing a module takes and which imports it is spent on.
+
+    python -m app.script.import_profile [--module app.main] [--runs 5] [--budget-ms 1500]
+
+Imports the module in fresh interpreters with `-X importtime` and keeps the
+fastest run of each import, so a cold disk cache or a busy machine does
+not count against it. Exits with 1 when the total is over `--budget-ms`,
+which makes it usable as a check that a change did not slow down cold
+starts.
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module: str) -> List[Tuple[str, int, int, int]]:
+    """(name, self us, cumulative us, nesting depth) of every import, in order."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"importing {module} failed:\n{result.stderr[-2000:]}")
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+
+def profile(module: str, runs: int) -> Dict[str, Any]:
+    cumulative: Dict[str, int] = {}
+    own: Dict[str, int] = {}
+    for _ in range(runs):
+        for name, self_us, cumulative_us, _ in import_times(module):
+            cumulative[name] = min(cumulative.get(name, cumulative_us), cumulative_us)
+            own[name] = min(own.get(name, self_us), self_us)
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us in own.items():
+        by_package[name.split(".", 1)[0]] += self_us
+
+    def top(values: Dict[str, int], count: int) -> List[Dict[str, Any]]:
+        return [
+            {"module": name, "ms": round(us / 1000, 1)}
+            for name, us in sorted(values.items(), key=lambda item: -item[1])[:count]
+        ]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": round(cumulative.get(module, 0) / 1000, 1),
+        "by_package": top(by_package, 15),
+        "slowest_cumulative": top({k: v for k, v in cumulative.items() if k != module}, 25),
+        "slowest_self": top(own, 15),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile import time")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, help="fail if importing takes longer")
+    args = parser.parse_args()
+
+    report = profile(args.module, args.runs)
+    if args.budget_ms is not None:
+        report["budget_ms"] = args.budget_ms
+        report["over_budget"] = report["total_ms"] > args.budget_ms
+    print(json.dumps(report, indent=2))
+    if report.get("over_budget"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
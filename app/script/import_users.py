@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from app.utils.user_import import FORMATS, MAX_CHUNK_SIZE, import_users
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-create users from a CSV or NDJSON file")
+    parser.add_argument("path", help="file to import, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument(
+        "--chunk-size", type=int, default=1000, help=f"rows per INSERT, at most {MAX_CHUNK_SIZE}"
+    )
+    parser.add_argument("--errors", help="write per-row errors to this file as NDJSON")
+    parser.add_argument("--max-errors", type=int, default=100000, help="errors to keep")
+    args = parser.parse_args()
+    if not 0 < args.chunk_size <= MAX_CHUNK_SIZE:
+        parser.error(f"--chunk-size must be between 1 and {MAX_CHUNK_SIZE}")
+    return args
+
+
+async def run(args: argparse.Namespace) -> int:
+    format = args.format or args.path.rsplit(".", 1)[-1].lower()
+    if format not in FORMATS:
+        logger.error(f"Cannot guess the format of {args.path}, pass --format")
+        return 2
+    if args.path == "-":
+        result = await import_users(
+            sys.stdin, format, chunk_size=args.chunk_size, max_errors=args.max_errors
+        )
+    else:
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            result = await import_users(
+                f, format, chunk_size=args.chunk_size, max_errors=args.max_errors
+            )
+
+    if args.errors:
+        with open(args.errors, "w") as f:
+            for error in result.errors:
+                f.write(error.json() + "\n")
+    else:
+        for error in result.errors:
+            logger.warning(f"row {error.row} ({error.email}): {error.error}")
+    logger.info(f"Created {result.created} users, {result.failed} rows failed")
+    return 0 if not result.failed else 1
+
+
+def main() -> None:
+    sys.exit(asyncio.run(run(parse_args())))
+
+
+if __name__ == "__main__":
+    main()
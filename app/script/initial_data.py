@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from app.db.init_db import init_db
@@ -7,14 +8,14 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def init() -> None:
-    db = SessionLocal()
-    init_db(db)
+async def init() -> None:
+    async with SessionLocal() as db:
+        await init_db(db)
 
 
 def main() -> None:
     logger.info("Creating initial data")
-    init()
+    asyncio.run(init())
     logger.info("Initial data created")
 
 
@@ -0,0 +1,50 @@
+"""
+Everything a container does before serving, in one interpreter: wait for
+the database, run the migrations and create the initial data.
+
+    python -m app.script.prestart
+
+Replaces running backend_pre_start, alembic and initial_data as three
+processes that each imported the app from scratch.
+"""
+import asyncio
+import logging
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+from app.db.session import engine
+from app.script import backend_pre_start, initial_data
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+async def run_async(step) -> None:
+    try:
+        await step()
+    finally:
+        # Pooled connections belong to this event loop, which ends here
+        await engine.dispose()
+
+
+def main() -> None:
+    logger.info("Waiting for the database")
+    asyncio.run(run_async(backend_pre_start.init))
+
+    logger.info("Running migrations")
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+    logger.info("Creating initial data")
+    asyncio.run(run_async(initial_data.init))
+    logger.info("Prestart finished")
+
+
+if __name__ == "__main__":
+    main()
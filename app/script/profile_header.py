@@ -0,0 +1,20 @@
+import argparse
+
+from app.core.config import settings
+from app.utils.profiling import sign
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Print an X-Profile header value that has one request profiled"
+    )
+    parser.add_argument("method", help="e.g. PUT")
+    parser.add_argument("path", help="request path without the query string, e.g. /api/v1/users/me")
+    args = parser.parse_args()
+    if not settings.PROFILING_SECRET:
+        parser.error("PROFILING_SECRET is not set")
+    print(sign(settings.PROFILING_SECRET, args.method, args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SMTPSink():
+    """
+    Minimal SMTP server that accepts every message and keeps it.
+
+    Point SMTP_HOST/SMTP_PORT at it (with SMTP_TLS=false) to exercise the
+    email queue locally or under load without a real mail server.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025, out_dir: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.messages: List[bytes] = []
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if self.out_dir:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _store(self, data: bytes) -> None:
+        self.messages.append(data)
+        if self.out_dir:
+            path = self.out_dir / f"{time.time_ns()}-{len(self.messages)}.eml"
+            path.write_bytes(data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 smtp-sink ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                if command == "EHLO":
+                    reply("250-smtp-sink")
+                    reply("250 8BITMIME")
+                elif command == "DATA":
+                    reply("354 end data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line in (b".\r\n", b".\n"):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    self._store(b"".join(lines))
+                    reply("250 OK: queued")
+                elif command == "QUIT":
+                    reply("221 bye")
+                    await writer.drain()
+                    break
+                elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    reply("250 OK")
+                else:
+                    reply("502 command not implemented")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Accept and store mail sent over SMTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--out-dir", help="write each message to this directory as .eml")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    sink = SMTPSink(args.host, args.port, args.out_dir)
+    await sink.start()
+    logger.info(f"SMTP sink listening on {args.host}:{args.port}")
+    try:
+        while True:
+            count = len(sink.messages)
+            await asyncio.sleep(10)
+            if len(sink.messages) != count:
+                logger.info(f"{len(sink.messages)} messages over {sink.connections} connections")
+    finally:
+        await sink.stop()
+
+
+def main() -> None:
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Production entry point: gunicorn managing uvicorn workers.
+
+    python -m app.server
+
+The app is imported once in the master and forked into the workers. Each
+worker warms up (see app/core/warmup.py) before it starts accepting
+connections, and /ready reports 200 only from then on. On SIGTERM a
+worker first reports 503 on /ready for DRAIN_SECONDS while still serving,
+so the load balancer stops sending it traffic, then stops accepting and
+finishes its in-flight requests.
+
+Environment:
+    BIND / HOST / PORT      where to listen (default 0.0.0.0:80)
+    WEB_CONCURRENCY         number of workers; otherwise WORKERS_PER_CORE
+                            (default 1) times the CPU count, at least 2,
+                            capped by MAX_WORKERS
+    DRAIN_SECONDS           time to report not-ready before stopping (5)
+    GRACEFUL_TIMEOUT        time left after draining for requests to finish (30)
+    TIMEOUT, KEEP_ALIVE     gunicorn worker timeout (60) and keep-alive (5)
+    LOG_LEVEL               gunicorn log level (info)
+
+HASHING_POOL_SIZE defaults to the CPU count divided among the workers
+rather than the full CPU count per worker.
+"""
+import asyncio
+import multiprocessing
+import os
+from typing import Any, Dict
+
+
+def worker_count() -> int:
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    workers = max(2, int(float(os.getenv("WORKERS_PER_CORE", 1)) * multiprocessing.cpu_count()))
+    if os.getenv("MAX_WORKERS"):
+        workers = min(workers, int(os.environ["MAX_WORKERS"]))
+    return workers
+
+
+WORKERS = worker_count()
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", 5))
+
+# Before the app and its settings are imported
+os.environ.setdefault("HASHING_POOL_SIZE", str(max(1, multiprocessing.cpu_count() // WORKERS)))
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+from uvicorn.main import Server  # noqa: E402
+from uvicorn.workers import UvicornWorker  # noqa: E402
+
+
+class DrainingServer(Server):
+    def handle_exit(self, sig, frame) -> None:
+        from app.core.warmup import readiness
+
+        if DRAIN_SECONDS > 0 and not readiness.draining:
+            readiness.draining = True
+            asyncio.get_event_loop().call_later(DRAIN_SECONDS, super().handle_exit, sig, frame)
+            return
+        # A second signal skips what is left of the drain
+        super().handle_exit(sig, frame)
+
+
+class Worker(UvicornWorker):
+    # uvloop and httptools when installed, asyncio and h11 otherwise
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto"}
+
+    def run(self) -> None:
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        asyncio.get_event_loop().run_until_complete(server.serve(sockets=self.sockets))
+
+
+class Application(BaseApplication):
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        from app.main import app
+
+        return app
+
+
+def options() -> Dict[str, Any]:
+    bind = os.getenv("BIND") or f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 80)}"
+    return {
+        "bind": bind,
+        "workers": WORKERS,
+        "worker_class": "app.server.Worker",
+        "preload_app": True,
+        "timeout": int(os.getenv("TIMEOUT", 60)),
+        "keepalive": int(os.getenv("KEEP_ALIVE", 5)),
+        "graceful_timeout": int(DRAIN_SECONDS + float(os.getenv("GRACEFUL_TIMEOUT", 30))),
+        "loglevel": os.getenv("LOG_LEVEL", "info"),
+        "accesslog": "-",
+        "errorlog": "-",
+    }
+
+
+def main() -> None:
+    Application(options()).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import os
+
+# Settings are read from the environment on import. These only have to be
+# well-formed: nothing under test connects to the database or the network.
+for name, value in {
+    "PROJECT_NAME": "identity",
+    "SECRET_KEY": "test-secret",
+    "TOKEN_URL": "/api/v1/access-token",
+    "ENCRYPT_ALGORITHM": "HS256",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "app",
+    "CASH_SERVICE_BASE_URL": "http://cash.test",
+    "SMTP_PORT": "25",
+    "SERVER_HOST": "http://localhost",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "admin",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest
+
+
+class Clock():
+    """Stands in for the `time` module of the module under test."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
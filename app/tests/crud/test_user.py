@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app import crud
+from app.crud.user import CRUDUser
+from app.models.user import User
+from app.schemas.token import TokenPayload
+from app.utils.cache import LocalCacheBackend, ReadThroughCache
+from app.utils.token_cache import token_cache
+
+
+class FakeResult():
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession():
+    """Answers each execute() with the next of `results`, a list of rows each."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return FakeResult(self.results.pop(0))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def where_clause(statement):
+    sql = str(statement.compile())
+    return sql.split("WHERE", 1)[1].split("RETURNING", 1)[0]
+
+
+def make_user(**kw):
+    fields = {"id": 1, "email": "user@example.com", "nickname": "old", "version": 1}
+    return User(**{**fields, **kw})
+
+
+@pytest.fixture
+def user_crud():
+    return CRUDUser(User, cache=ReadThroughCache(LocalCacheBackend(max_size=100, ttl=60)))
+
+
+def cached(user_crud, user):
+    async def fill():
+        for key in user_crud.cache_keys(user):
+            await user_crud.cache.backend.set(key, {"id": user.id})
+        token_cache.set("token", TokenPayload(sub=user.id), {"id": user.id}, None)
+
+    async def check():
+        return [await user_crud.cache.backend.get(k) for k in user_crud.cache_keys(user)]
+
+    asyncio.run(fill())
+    return lambda: [v is not None for v in asyncio.run(check())] + [
+        token_cache.get("token") is not None
+    ]
+
+
+@pytest.fixture(autouse=True)
+def clean_token_cache():
+    yield
+    token_cache.invalidate_user(1)
+
+
+def test_update_writes_and_invalidates(user_crud):
+    user = make_user()
+    is_cached = cached(user_crud, user)
+    db = FakeSession([make_user(nickname="new", version=2)])
+    updated = asyncio.run(user_crud.update(db, db_obj=user, obj_in={"nickname": "new", "version": 1}))
+    assert (updated.nickname, updated.version) == ("new", 2)
+    assert db.commits == 1
+    assert is_cached() == [False, False, False]
+
+
+def test_update_of_a_stale_version_raises(user_crud):
+    user = make_user()
+    is_cached = cached(user_crud, user)
+    # No row at version 1, but the row is there
+    db = FakeSession([], [(1,)])
+    with pytest.raises(crud.StaleVersionError):
+        asyncio.run(user_crud.update(db, db_obj=user, obj_in={"nickname": "new", "version": 1}))
+    assert "version" in where_clause(db.statements[0])
+    # So the client reloads the current row, not the cached copy
+    assert is_cached() == [False, False, False]
+
+
+def test_update_of_a_missing_row_returns_none(user_crud):
+    user = make_user()
+    is_cached = cached(user_crud, user)
+    db = FakeSession([], [])
+    assert asyncio.run(
+        user_crud.update(db, db_obj=user, obj_in={"nickname": "new", "version": 1})
+    ) is None
+    assert is_cached() == [True, True, True]
+
+
+def test_unversioned_update_does_not_check_for_conflicts(user_crud):
+    user = make_user()
+    db = FakeSession([])
+    assert asyncio.run(user_crud.update(db, db_obj=user, obj_in={"nickname": "new"})) is None
+    assert len(db.statements) == 1
+    assert "version" not in where_clause(db.statements[0])
+
+
+def test_update_without_changes_skips_the_database(user_crud):
+    user = make_user()
+    db = FakeSession()
+    assert asyncio.run(user_crud.update(db, db_obj=user, obj_in={"version": 1})) is user
+    assert db.statements == []
@@ -0,0 +1,23 @@
+from app.utils.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(capacity=10000)
+    emails = [f"user{i}@example.com" for i in range(10000)]
+    for email in emails:
+        bloom.add(email)
+    assert all(email in bloom for email in emails)
+    assert bloom.count == 10000
+
+
+def test_false_positive_rate_near_the_target():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"user{i}@example.com")
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+    assert false_positives < 10000 * 0.02
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=0)
+    assert "user@example.com" not in bloom
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from app.utils import cache
+from app.utils.cache import LocalCacheBackend, ReadThroughCache, TTLCache
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+
+
+def test_ttl_cache_expires_entries(clock):
+    evicted = []
+    ttl_cache = TTLCache(max_size=10, ttl=60, on_evict=lambda k, v: evicted.append((k, v)))
+    ttl_cache.set("a", 1)
+    clock.advance(59.9)
+    assert ttl_cache.get("a") == 1
+    clock.advance(0.1)
+    assert ttl_cache.get("a") is None
+    assert evicted == [("a", 1)]
+    assert (ttl_cache.hits, ttl_cache.misses) == (1, 1)
+    assert len(ttl_cache) == 0
+
+
+def test_ttl_cache_caps_entry_ttl(clock):
+    ttl_cache = TTLCache(max_size=10, ttl=60)
+    ttl_cache.set("short", 1, ttl=10)
+    ttl_cache.set("long", 2, ttl=600)
+    ttl_cache.set("expired", 3, ttl=0)
+    assert "expired" not in ttl_cache._data
+    clock.advance(10)
+    assert ttl_cache.get("short") is None
+    assert ttl_cache.get("long") == 2
+    clock.advance(50)
+    assert ttl_cache.get("long") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    evicted = []
+    ttl_cache = TTLCache(max_size=2, ttl=60, on_evict=lambda k, v: evicted.append(k))
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+    assert evicted == ["b"]
+    assert ttl_cache.evictions == 1
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def make_cache():
+    return ReadThroughCache(LocalCacheBackend(max_size=100, ttl=60))
+
+
+class Loader():
+    """A load that blocks until released, counting how often it ran."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.value
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_misses_share_one_load():
+    async def run():
+        read_through = make_cache()
+        load = Loader({"id": 1})
+        tasks = [asyncio.create_task(read_through.get_or_load("user:1", load)) for _ in range(10)]
+        await settle()
+        load.release.set()
+        results = await asyncio.gather(*tasks)
+        assert results == [{"id": 1}] * 10
+        assert load.calls == 1
+        assert read_through.coalesced == 9
+        # Stored, so the next read does not load at all
+        assert await read_through.get_or_load("user:1", load) == {"id": 1}
+        assert load.calls == 1
+        assert read_through.hits == 1
+
+    asyncio.run(run())
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    async def run():
+        read_through = make_cache()
+        stale = Loader({"id": 1, "version": 1})
+        task = asyncio.create_task(read_through.get_or_load("user:1", stale))
+        await settle()
+        await read_through.invalidate("user:1")
+        stale.release.set()
+        assert await task == {"id": 1, "version": 1}
+
+        fresh = Loader({"id": 1, "version": 2})
+        fresh.release.set()
+        assert await read_through.get_or_load("user:1", fresh) == {"id": 1, "version": 2}
+        assert fresh.calls == 1
+
+    asyncio.run(run())
+
+
+def test_failed_load_reaches_every_waiter():
+    async def run():
+        read_through = make_cache()
+
+        async def load():
+            await asyncio.sleep(0)
+            raise RuntimeError("database down")
+
+        results = await asyncio.gather(
+            *(read_through.get_or_load("user:1", load) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert read_through._loading == {}
+
+    asyncio.run(run())
+
+
+def test_cancelled_load_is_taken_over_by_a_waiter():
+    async def run():
+        read_through = make_cache()
+        load = Loader({"id": 1})
+        leader = asyncio.create_task(read_through.get_or_load("user:1", load))
+        await settle()
+        waiters = [asyncio.create_task(read_through.get_or_load("user:1", load)) for _ in range(3)]
+        await settle()
+
+        leader.cancel()
+        await settle()
+        load.release.set()
+        assert await asyncio.gather(*waiters) == [{"id": 1}] * 3
+        assert leader.cancelled()
+        assert load.calls == 2
+
+    asyncio.run(run())
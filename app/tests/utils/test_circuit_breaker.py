@@ -0,0 +1,83 @@
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+
+def open_circuit(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() is None
+
+
+def test_half_open_lets_a_single_trial_through(breaker, clock):
+    open_circuit(breaker)
+    clock.advance(29.9)
+    assert breaker.allow() is None
+    clock.advance(0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is None
+
+
+def test_trial_success_closes(breaker, clock):
+    open_circuit(breaker)
+    clock.advance(30)
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+    breaker.record_success()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() == CircuitBreaker.CLOSED
+
+
+def test_trial_failure_reopens_for_another_timeout(breaker, clock):
+    open_circuit(breaker)
+    clock.advance(30)
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+    breaker.record_failure()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.advance(29)
+    assert breaker.allow() is None
+    clock.advance(1)
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_trial_frees_the_slot(breaker, clock):
+    open_circuit(breaker)
+    clock.advance(30)
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+    # Neither success nor failure was recorded
+    breaker.release()
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+
+
+def test_late_closed_call_does_not_free_the_trial(breaker, clock):
+    late = breaker.allow()
+    assert late == CircuitBreaker.CLOSED
+    open_circuit(breaker)
+    clock.advance(30)
+    assert breaker.allow() == CircuitBreaker.HALF_OPEN
+
+    # The call let through before the circuit opened finishes now
+    breaker.record_failure()
+    assert breaker.allow() is None
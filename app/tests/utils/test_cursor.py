@@ -0,0 +1,35 @@
+import base64
+
+import pytest
+
+from app.utils.cursor import MAX_ID, MIN_ID, decode_cursor, encode_cursor
+
+
+def raw_cursor(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("last_id", [0, 1, 12345, MIN_ID, MAX_ID])
+def test_round_trip(last_id):
+    cursor = encode_cursor(last_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == last_id
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "%%%%",
+    raw_cursor(b"not json"),
+    raw_cursor(b"[1]"),
+    raw_cursor(b'{"after": 1}'),
+    raw_cursor(b'{"id": "1"}'),
+    raw_cursor(b'{"id": 1.5}'),
+    raw_cursor(b'{"id": true}'),
+    raw_cursor(b'{"id": null}'),
+    raw_cursor(b'{"id": [1]}'),
+    raw_cursor(f'{{"id": {MAX_ID + 1}}}'.encode()),
+    raw_cursor(f'{{"id": {MIN_ID - 1}}}'.encode()),
+])
+def test_rejects_invalid_cursors(cursor):
+    assert decode_cursor(cursor) is None
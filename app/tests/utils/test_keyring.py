@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwt
+
+from app.utils import keyring as keyring_module
+from app.utils.keyring import ACCESS_TOKEN, PASSWORD_RESET_TOKEN, KeyRing
+
+RELOAD_SECONDS = 60
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(clock, monkeypatch):
+    monkeypatch.setattr(keyring_module, "time", clock)
+
+
+def write_key(directory, kid, mtime):
+    private = ec.generate_private_key(ec.SECP256R1())
+    path = directory / f"{kid}.pem"
+    path.write_bytes(private.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    os.utime(path, (mtime, mtime))
+
+
+def kid_of(token):
+    return jwt.get_unverified_header(token)["kid"]
+
+
+def make_ring(directory):
+    ring = KeyRing(str(directory), reload_interval=RELOAD_SECONDS)
+    ring.load()
+    return ring
+
+
+def test_newest_private_key_signs(tmp_path):
+    write_key(tmp_path, "2024-01", mtime=1_000)
+    write_key(tmp_path, "2024-02", mtime=2_000)
+    ring = make_ring(tmp_path)
+    token = ring.encode({"sub": "1", "typ": ACCESS_TOKEN})
+    assert kid_of(token) == "2024-02"
+    assert ring.decode(token, ACCESS_TOKEN)["sub"] == "1"
+
+
+def test_token_type_is_checked(tmp_path):
+    write_key(tmp_path, "k1", mtime=1_000)
+    ring = make_ring(tmp_path)
+    reset = ring.encode({"sub": "1", "typ": PASSWORD_RESET_TOKEN})
+    untyped = ring.encode({"sub": "1"})
+    with pytest.raises(jwt.JWTError):
+        ring.decode(reset, ACCESS_TOKEN)
+    with pytest.raises(jwt.JWTError):
+        ring.decode(untyped, ACCESS_TOKEN)
+    assert ring.decode(reset, PASSWORD_RESET_TOKEN)["sub"] == "1"
+
+
+def test_rotation_is_picked_up_after_the_reload_interval(tmp_path, clock):
+    write_key(tmp_path, "old", mtime=1_000)
+    ring = make_ring(tmp_path)
+    old_token = ring.encode({"sub": "1", "typ": ACCESS_TOKEN})
+
+    write_key(tmp_path, "new", mtime=2_000)
+    clock.advance(RELOAD_SECONDS - 1)
+    assert kid_of(ring.encode({"sub": "1", "typ": ACCESS_TOKEN})) == "old"
+    clock.advance(1)
+    assert kid_of(ring.encode({"sub": "1", "typ": ACCESS_TOKEN})) == "new"
+    # Tokens signed before the rotation still verify
+    assert ring.decode(old_token, ACCESS_TOKEN)["sub"] == "1"
+    assert {key["kid"] for key in json.loads(ring.jwks())["keys"]} == {"old", "new"}
+
+
+def test_retired_key_stops_verifying(tmp_path, clock):
+    write_key(tmp_path, "old", mtime=1_000)
+    ring = make_ring(tmp_path)
+    old_token = ring.encode({"sub": "1", "typ": ACCESS_TOKEN})
+
+    write_key(tmp_path, "new", mtime=2_000)
+    (tmp_path / "old.pem").unlink()
+    clock.advance(RELOAD_SECONDS)
+    with pytest.raises(jwt.JWTError):
+        ring.decode(old_token, ACCESS_TOKEN)
+
+
+def test_unknown_kid_triggers_a_rescan(tmp_path, clock):
+    write_key(tmp_path, "old", mtime=1_000)
+    ring = make_ring(tmp_path)
+
+    # Another replica picks up a new key before this one is due to rescan
+    write_key(tmp_path, "new", mtime=2_000)
+    clock.advance(1)
+    replica = make_ring(tmp_path)
+    token = replica.encode({"sub": "1", "typ": ACCESS_TOKEN})
+    assert kid_of(token) == "new"
+    assert ring.decode(token, ACCESS_TOKEN)["sub"] == "1"
+
+
+def test_unknown_kid_rescans_are_spaced_out(tmp_path, clock, monkeypatch):
+    write_key(tmp_path, "k1", mtime=1_000)
+    ring = make_ring(tmp_path)
+    forged = jwt.encode({"sub": "1", "typ": ACCESS_TOKEN}, "x", headers={"kid": "missing"})
+    scans = []
+    scan = ring._scan
+    monkeypatch.setattr(ring, "_scan", lambda: scans.append(1) or scan())
+
+    clock.advance(1)
+    for _ in range(5):
+        with pytest.raises(jwt.JWTError):
+            ring.decode(forged, ACCESS_TOKEN)
+    assert len(scans) == 1
+
+
+def test_load_needs_a_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyring_module.settings, "SECRET_KEY", None)
+    with pytest.raises(RuntimeError):
+        KeyRing(None, reload_interval=RELOAD_SECONDS).load()
+    with pytest.raises(RuntimeError):
+        KeyRing(str(tmp_path), reload_interval=RELOAD_SECONDS).load()
@@ -0,0 +1,123 @@
+import asyncio
+import copy
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils import cache, rate_limit
+from app.utils.cache import FakeKeyValueClient
+from app.utils.rate_limit import (
+    KeyValueRateLimitBackend, LocalRateLimitBackend, RateLimiter, _retry_after, parse_limit
+)
+
+WINDOW = 60.0
+LIMIT = (3, WINDOW)
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(clock, monkeypatch):
+    # Start exactly on a window boundary
+    clock.now = 1000 * WINDOW
+    monkeypatch.setattr(rate_limit, "time", clock)
+    monkeypatch.setattr(cache, "time", clock)
+
+
+def hit(backend, key="k", limit=LIMIT):
+    return asyncio.run(backend.hit(key, limit))
+
+
+def test_parse_limit():
+    assert parse_limit("10/60") == (10, 60.0)
+    assert parse_limit("5/0.5") == (5, 0.5)
+    assert parse_limit("") is None
+    assert parse_limit(None) is None
+
+
+def test_retry_after_within_the_window():
+    # 2 of 3 used now, 3 in the previous window: wait for all of it to slide out
+    assert _retry_after(3, 2, 30.0, LIMIT) == pytest.approx(30.0)
+    # 6 previous weigh 3 at 30s in; one slot frees once they weigh 1
+    assert _retry_after(6, 1, 30.0, LIMIT) == pytest.approx(20.0)
+
+
+def test_retry_after_into_the_next_window():
+    # 4 attempts now: next window, once they weigh 2 with the retry on top
+    assert _retry_after(0, 4, 0.0, LIMIT) == pytest.approx(WINDOW + WINDOW / 2)
+    assert _retry_after(0, 1, 10.0, (1, WINDOW)) == pytest.approx(2 * WINDOW - 10.0)
+
+
+@pytest.mark.parametrize("backend", [
+    lambda: LocalRateLimitBackend(max_keys=100),
+    lambda: KeyValueRateLimitBackend(FakeKeyValueClient()),
+])
+def test_fixed_count_per_window(backend, clock):
+    backend = backend()
+    assert [hit(backend) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert hit(backend) == pytest.approx(WINDOW + WINDOW / 2)
+    # Rejected attempts count too, so hammering on pushes the wait out
+    assert hit(backend) == pytest.approx(WINDOW + WINDOW * 3 / 5)
+
+
+@pytest.mark.parametrize("backend", [
+    lambda: LocalRateLimitBackend(max_keys=100),
+    lambda: KeyValueRateLimitBackend(FakeKeyValueClient()),
+])
+def test_previous_window_weighs_by_overlap(backend, clock):
+    backend = backend()
+    for _ in range(3):
+        hit(backend)
+    clock.advance(WINDOW + WINDOW / 2)
+    # 3 * 0.5 + 1 fits, 3 * 0.5 + 2 does not until the old window is gone
+    assert hit(backend) == 0.0
+    assert hit(backend) == pytest.approx(WINDOW / 2)
+    clock.advance(WINDOW)
+    assert hit(backend) == 0.0
+
+
+@pytest.mark.parametrize("count", [1, 2, 5])
+@pytest.mark.parametrize("offset", [0.0, 7.5, 42.0])
+def test_waiting_retry_after_is_enough_and_needed(clock, count, offset):
+    backend = LocalRateLimitBackend(max_keys=100)
+    clock.advance(offset)
+    for _ in range(count):
+        assert hit(backend, limit=(count, WINDOW)) == 0.0
+        clock.advance(5.0)
+    wait = hit(backend, limit=(count, WINDOW))
+    assert wait > 0
+
+    early = copy.deepcopy(backend)
+    clock.advance(wait - 0.01)
+    assert hit(early, limit=(count, WINDOW)) > 0
+    clock.advance(0.02)
+    assert hit(backend, limit=(count, WINDOW)) == 0.0
+
+
+def test_local_backend_evicts_least_recently_seen(clock):
+    backend = LocalRateLimitBackend(max_keys=2)
+    hit(backend, "a")
+    hit(backend, "b")
+    hit(backend, "a")
+    hit(backend, "c")
+    assert backend.stats() == {"size": 2, "evictions": 1}
+    assert set(backend._windows) == {"a", "c"}
+
+
+def make_request(ip):
+    return Request({"type": "http", "headers": [], "client": (ip, 12345)})
+
+
+def test_email_limit_is_kept_per_ip():
+    limiter = RateLimiter(
+        LocalRateLimitBackend(max_keys=100),
+        {"login": {"ip": None, "email": (2, WINDOW)}},
+    )
+    attacker, owner = make_request("10.0.0.1"), make_request("10.0.0.2")
+    for _ in range(2):
+        asyncio.run(limiter.check("login", attacker, "Someone@example.com"))
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(limiter.check("login", attacker, "someone@example.com"))
+    assert e.value.status_code == 429
+    assert e.value.headers["Retry-After"] == "100"
+
+    asyncio.run(limiter.check("login", owner, "someone@example.com"))
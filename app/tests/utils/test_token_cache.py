@@ -0,0 +1,51 @@
+import pytest
+
+from app.schemas.token import TokenPayload
+from app.utils import cache, token_cache as token_cache_module
+from app.utils.token_cache import TokenCache
+
+
+@pytest.fixture
+def tokens(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+    monkeypatch.setattr(token_cache_module, "time", clock)
+    return TokenCache(max_size=3, ttl=300)
+
+
+def remember(tokens, token, user_id, exp=None):
+    tokens.set(token, TokenPayload(sub=user_id), {"id": user_id}, exp)
+
+
+def test_invalidate_user_drops_only_their_tokens(tokens):
+    remember(tokens, "a1", 1)
+    remember(tokens, "a2", 1)
+    remember(tokens, "b1", 2)
+    tokens.invalidate_user(1)
+    assert tokens.get("a1") is None
+    assert tokens.get("a2") is None
+    assert tokens.get("b1")[1] == {"id": 2}
+    assert tokens.stats()["size"] == 1
+
+
+def test_entries_expire_with_the_token(tokens, clock):
+    remember(tokens, "short", 1, exp=clock.time() + 10)
+    remember(tokens, "expired", 1, exp=clock.time() - 1)
+    assert tokens.get("expired") is None
+    clock.advance(9)
+    assert tokens.get("short") is not None
+    clock.advance(1)
+    assert tokens.get("short") is None
+
+
+def test_evicted_tokens_are_forgotten_per_user(tokens):
+    for i in range(4):
+        remember(tokens, f"t{i}", i)
+    assert tokens.get("t0") is None
+    assert 0 not in tokens._keys_by_user
+    assert set(tokens._keys_by_user) == {1, 2, 3}
+
+
+def test_raw_tokens_are_not_kept(tokens):
+    remember(tokens, "secret-token", 1)
+    assert "secret-token" not in tokens._cache._data
+    assert tokens.get("secret-token") is not None
@@ -1,11 +1,33 @@
-from .get_kst_now import get_kst_now
-from .send_email import(
-    send_new_account_email,
-    send_reset_password_email
-)
-from .security import (
-    create_access_token,
-    verify_password,
-    get_password_hash,
-    generate_password_reset_token,
-)
\ No newline at end of file
+from importlib import import_module
+from typing import Any
+
+# These share their module's name; importing the module would bind the
+# package attribute to it, so the instances are bound up front instead
+from .email_queue import email_queue
+from .hasher import hasher
+
+# Names re-exported from submodules, imported on first access (PEP 562) so
+# that importing one light helper does not pull in emails, jinja or jose
+_EXPORTS = {
+    "get_kst_now": ".get_kst_now",
+    "encode_cursor": ".cursor",
+    "decode_cursor": ".cursor",
+    "send_new_account_email": ".send_email",
+    "send_reset_password_email": ".send_email",
+    "load_templates": ".send_email",
+    "create_access_token": ".security",
+    "verify_password": ".security",
+    "get_password_hash": ".security",
+    "generate_password_reset_token": ".security",
+}
+
+__all__ = ["email_queue", "hasher", *_EXPORTS]
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
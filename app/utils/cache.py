@@ -0,0 +1,256 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class TTLCache():
+    """
+    Bounded in-process LRU cache whose entries also expire.
+
+    Each entry carries its own deadline, so callers can cap it below the
+    default TTL (e.g. at a token's `exp`). `on_evict` is called with the key
+    and value of every entry dropped for being stale or least recently used.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            evicted_key, (_, evicted) = self._data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend():
+    """Storage behind a ReadThroughCache; values are JSON-compatible dicts."""
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalCacheBackend(CacheBackend):
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._cache.set(key, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._cache.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._cache), "evictions": self._cache.evictions}
+
+
+class KeyValueCacheBackend(CacheBackend):
+    """
+    Shared cache on an external key-value store.
+
+    `client` needs async `get(key)`, `set(key, value, ex=seconds)` and
+    `delete(*keys)`, which is the redis.asyncio interface; FakeKeyValueClient
+    provides the same interface in memory.
+    """
+
+    def __init__(self, client: Any, ttl: float, prefix: str = "identity:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+
+class FakeKeyValueClient():
+    """In-memory stand-in for an external key-value store, for local runs and tests."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ex: Optional[float] = None) -> None:
+        self._data[key] = (None if ex is None else time.monotonic() + ex, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        expires_at = self._data[key][0] if key in self._data else None
+        self._data[key] = (expires_at, str(value))
+        return value
+
+    async def expire(self, key: str, seconds: float) -> None:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data[key] = (time.monotonic() + seconds, entry[1])
+
+
+class _LoadCancelled(Exception):
+    """Set on a shared load whose caller was cancelled, so the others retry it."""
+
+
+class ReadThroughCache():
+    """
+    Loads missing entries through a caller-supplied coroutine.
+
+    Concurrent misses on one key share a single load (single-flight), so a
+    burst of requests for the same row costs one query. A load that races
+    with an invalidation of its key is returned but not stored. If the
+    request running the load is cancelled, the ones waiting on it load the
+    entry themselves instead of failing with it.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._loading: Dict[str, "asyncio.Future[Optional[Dict[str, Any]]]"] = {}
+        self._stale: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(
+        self, key: str, load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+    ) -> Optional[Dict[str, Any]]:
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        while pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except _LoadCancelled:
+                # One of the waiters takes the load over, the rest share it again
+                pending = self._loading.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            # Not cancel(): that would cancel every request waiting on this load
+            future.set_exception(_LoadCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if value is not None and key not in self._stale:
+                await self.backend.set(key, value)
+            return value
+        finally:
+            del self._loading[key]
+            self._stale.discard(key)
+
+    async def invalidate(self, *keys: str) -> None:
+        self._stale.update(key for key in keys if key in self._loading)
+        await self.backend.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            **self.backend.stats(),
+        }
+
+
+def build_cache(
+    backend: str, *, url: Optional[str], max_size: int, ttl: float
+) -> Optional[ReadThroughCache]:
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return ReadThroughCache(LocalCacheBackend(max_size=max_size, ttl=ttl))
+    if backend == "fake":
+        return ReadThroughCache(KeyValueCacheBackend(FakeKeyValueClient(), ttl=ttl))
+    if backend == "redis":
+        # Optional dependency, only needed when the cache is shared between workers
+        from redis import asyncio as aioredis
+
+        return ReadThroughCache(KeyValueCacheBackend(aioredis.from_url(url), ttl=ttl))
+    raise ValueError(f"Unknown cache backend: {backend}")
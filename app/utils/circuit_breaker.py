@@ -0,0 +1,60 @@
+import time
+from typing import Optional
+
+
+class CircuitBreaker():
+    """
+    Fails fast after `failure_threshold` consecutive failures.
+
+    The circuit stays open for `reset_timeout` seconds, then lets a single
+    trial call through (half-open). A success closes it again, a failure
+    re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> Optional[str]:
+        """
+        The state a call is let through in, or None if it is refused. A call
+        let through HALF_OPEN is the trial and must be ended with release().
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return state
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return state
+        return None
+
+    def release(self) -> None:
+        """
+        End the trial however it went, cancelled included. Only the trial
+        may call this; a call let through CLOSED that finishes late would
+        otherwise let a second trial through.
+        """
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
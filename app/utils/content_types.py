@@ -0,0 +1,43 @@
+import json
+from typing import Any
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _msgpack() -> Any:
+    # Optional dependency; JSON keeps working without it
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=415, detail="MessagePack is not supported here")
+    return msgpack
+
+
+def is_msgpack(media_type: str) -> bool:
+    return any(t in media_type for t in MSGPACK_MEDIA_TYPES)
+
+
+async def read_body(request: Request) -> Any:
+    """Decode a JSON or MessagePack request body according to its Content-Type."""
+    body = await request.body()
+    try:
+        if is_msgpack(request.headers.get("content-type", "")):
+            return _msgpack().unpackb(body, raw=False)
+        return json.loads(body)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=400, detail="Malformed request body")
+
+
+def render(request: Request, content: Any) -> Response:
+    """Encode `content` as MessagePack if the client accepts it, JSON otherwise."""
+    if is_msgpack(request.headers.get("accept", "")):
+        return Response(
+            content=_msgpack().packb(content, use_bin_type=True),
+            media_type=MSGPACK_MEDIA_TYPES[0],
+        )
+    return JSONResponse(content)
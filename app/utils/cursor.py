@@ -0,0 +1,25 @@
+import base64
+import json
+from typing import Any, Optional
+
+
+def encode_cursor(last_id: Any) -> str:
+    """Opaque keyset cursor pointing just past `last_id`."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# User ids are 4-byte integers; anything else would fail in the query instead
+MIN_ID, MAX_ID = -2 ** 31, 2 ** 31 - 1
+
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """Return the id encoded in `cursor`, or None if it is not a valid cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value = json.loads(raw)["id"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or not MIN_ID <= value <= MAX_ID:
+        return None
+    return value
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from . import metrics
+
+if TYPE_CHECKING:
+    from emails.backend.smtp import SMTPBackend
+
+logger = logging.getLogger(__name__)
+
+EMAIL_SEND_SECONDS = metrics.histogram(
+    "email_send_seconds", "Time to hand one email to the SMTP server", ["result"]
+)
+
+
+@dataclass
+class OutgoingEmail:
+    message: Any
+    email_to: str
+    environment: Dict[str, Any]
+    attempts: int = 0
+
+
+def smtp_options() -> Dict[str, Any]:
+    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
+    if settings.SMTP_TLS:
+        smtp_options["tls"] = True
+    if settings.SMTP_USER:
+        smtp_options["user"] = settings.SMTP_USER
+    if settings.SMTP_PASSWORD:
+        smtp_options["password"] = settings.SMTP_PASSWORD
+    return smtp_options
+
+
+class EmailQueue():
+    """
+    In-process delivery queue drained by a few background workers.
+
+    Every worker keeps its own authenticated SMTP connection open and sends
+    whatever has queued up in one go, so a burst of mails shares one
+    connection instead of opening one per message. Failed sends are retried
+    with exponential backoff; mails still queued at shutdown are flushed for
+    up to `drain_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        max_size: int,
+        max_attempts: int,
+        retry_backoff: float,
+        drain_timeout: float = 10,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.drain_timeout = drain_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: List[asyncio.TimerHandle] = []
+        self._sent = 0
+        self._failed = 0
+        self._send_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        for handle in self._retries:
+            handle.cancel()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"dropping {self._queue.qsize()} queued emails on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, email: OutgoingEmail) -> None:
+        try:
+            self._queue.put_nowait(email)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Too many emails queued, try again later")
+
+    async def _worker(self) -> None:
+        from emails.backend.smtp import SMTPBackend
+
+        backend = SMTPBackend(fail_silently=False, **smtp_options())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                started_at = loop.time()
+                failed = await loop.run_in_executor(None, self._send_batch, backend, batch)
+                self._send_seconds += loop.time() - started_at
+                self._sent += len(batch) - len(failed)
+                for email in failed:
+                    self._retry(email)
+                for _ in batch:
+                    self._queue.task_done()
+        finally:
+            backend.close()
+
+    def _send_batch(self, backend: "SMTPBackend", batch: List[OutgoingEmail]) -> List[OutgoingEmail]:
+        failed = []
+        for email in batch:
+            started_at = time.perf_counter()
+            try:
+                response = email.message.send(
+                    to=email.email_to, render=email.environment, smtp=backend
+                )
+                logger.info(f"send email result: {response}")
+            except Exception as e:
+                logger.warning(f"sending email to {email.email_to} failed: {e!r}")
+                # Start over with a fresh connection for the rest of the batch
+                backend.close()
+                failed.append(email)
+                EMAIL_SEND_SECONDS.observe(time.perf_counter() - started_at, result="error")
+            else:
+                EMAIL_SEND_SECONDS.observe(time.perf_counter() - started_at, result="sent")
+        return failed
+
+    def _retry(self, email: OutgoingEmail) -> None:
+        email.attempts += 1
+        if email.attempts >= self.max_attempts:
+            self._failed += 1
+            logger.error(f"giving up on email to {email.email_to} after {email.attempts} attempts")
+            return
+        delay = self.retry_backoff * 2 ** (email.attempts - 1)
+        loop = asyncio.get_running_loop()
+
+        def requeue() -> None:
+            self._retries.remove(handle)
+            try:
+                self._queue.put_nowait(email)
+            except asyncio.QueueFull:
+                self._failed += 1
+                logger.error(f"dropping email to {email.email_to}, queue is full")
+
+        handle = loop.call_later(random.uniform(delay / 2, delay), requeue)
+        self._retries.append(handle)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "retrying": len(self._retries),
+            "sent": self._sent,
+            "failed": self._failed,
+            "send_seconds_total": self._send_seconds,
+        }
+
+
+email_queue = EmailQueue(
+    workers=settings.EMAIL_WORKERS,
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    max_size=settings.EMAIL_QUEUE_SIZE,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    retry_backoff=settings.EMAIL_RETRY_BACKOFF_SECONDS,
+)
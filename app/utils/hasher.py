@@ -0,0 +1,159 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from . import metrics
+from .security import (
+    get_password_hash,
+    get_password_hashes,
+    load_hash_backend,
+    verify_password,
+    verify_password_needs_update,
+)
+
+HASHING_WAIT_SECONDS = metrics.histogram(
+    "password_hashing_wait_seconds", "Time jobs queued for a hashing worker", ["op"]
+)
+HASHING_RUN_SECONDS = metrics.histogram(
+    "password_hashing_run_seconds", "Time jobs took in a hashing worker", ["op"]
+)
+HASHING_REJECTED = metrics.counter(
+    "password_hashing_rejected", "Jobs turned away because the pool was saturated"
+)
+
+
+class PasswordHasher():
+    """
+    Runs password hashing in a process pool so hashing never blocks the event loop.
+
+    At most `pool_size` jobs run at once and at most `queue_size` more may
+    wait for a free worker, each for no longer than `max_wait` seconds.
+    Anything beyond that is rejected with a 503 straight away.
+    """
+
+    def __init__(self, pool_size: int, queue_size: int, max_wait: float):
+        self.pool_size = pool_size
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _saturated(self) -> HTTPException:
+        self._rejected += 1
+        HASHING_REJECTED.inc()
+        return HTTPException(
+            status_code=503,
+            detail="Password hashing capacity exhausted, try again later",
+            headers={"Retry-After": str(max(1, round(self.max_wait)))},
+        )
+
+    async def _run(self, fn: Callable, *args: Any, bulk: bool = False) -> Any:
+        # Bulk jobs bypass admission control and wait as long as it takes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+            self._slots = asyncio.Semaphore(self.pool_size)
+        if not bulk and self._slots.locked() and self._waiting >= self.queue_size:
+            raise self._saturated()
+
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(
+                self._slots.acquire(), timeout=None if bulk else self.max_wait
+            )
+        except asyncio.TimeoutError:
+            raise self._saturated()
+        finally:
+            self._waiting -= 1
+
+        started_at = time.perf_counter()
+        self._wait_seconds += started_at - queued_at
+        HASHING_WAIT_SECONDS.observe(started_at - queued_at, op=fn.__name__)
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            run_seconds = time.perf_counter() - started_at
+            self._running -= 1
+            self._completed += 1
+            self._run_seconds += run_seconds
+            HASHING_RUN_SECONDS.observe(run_seconds, op=fn.__name__)
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_needs_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, bool]:
+        return await self._run(verify_password_needs_update, plain_password, hashed_password)
+
+    async def rehash(self, password: str) -> str:
+        """Hash outside admission control, for work nobody is waiting on."""
+        return await self._run(get_password_hash, password, bulk=True)
+
+    async def warm_up(self) -> None:
+        """Start every worker process with the hashing backend already loaded."""
+        # Loaded here first so that forked workers inherit it
+        load_hash_backend()
+        await asyncio.gather(
+            *(self._run(load_hash_backend, bulk=True) for _ in range(self.pool_size))
+        )
+
+    async def hash_many(
+        self, passwords: List[str], *, batch_size: int = 4, max_parallel: Optional[int] = None
+    ) -> List[str]:
+        """
+        Hash `passwords` in small batches, keeping at most `max_parallel` of
+        them in the pool so bulk work leaves workers free for logins.
+        """
+        limit = asyncio.Semaphore(max_parallel or max(1, self.pool_size // 2))
+
+        async def run_batch(batch: List[str]) -> List[str]:
+            async with limit:
+                return await self._run(get_password_hashes, batch, bulk=True)
+
+        batches = [
+            passwords[i:i + batch_size] for i in range(0, len(passwords), batch_size)
+        ]
+        results = await asyncio.gather(*[run_batch(batch) for batch in batches])
+        return [hashed for batch in results for hashed in batch]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "queue_size": self.queue_size,
+            "queue_depth": self._waiting,
+            "running": self._running,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "wait_seconds_total": self._wait_seconds,
+            "run_seconds_total": self._run_seconds,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._slots = None
+
+
+hasher = PasswordHasher(
+    pool_size=settings.HASHING_POOL_SIZE,
+    queue_size=settings.HASHING_QUEUE_SIZE,
+    max_wait=settings.HASHING_MAX_WAIT_SECONDS,
+)
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key, load_pem_public_key
+)
+from jose import jwk, jwt
+from jose.backends.base import Key
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+# The "typ" claim, so that one kind of token signed with these keys cannot
+# be presented as another
+ACCESS_TOKEN = "access"
+PASSWORD_RESET_TOKEN = "password_reset"
+
+
+class SigningKey():
+    def __init__(self, kid: str, algorithm: str, key: Key, public: Optional[Key], can_sign: bool):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.key = key
+        self.public = public
+        self.can_sign = can_sign
+
+
+def load_key(path: Path) -> SigningKey:
+    """
+    Load a PEM key, named `<kid>.pem`. Private keys can sign; public keys
+    only verify, which is how retired keys are kept around until the
+    tokens they signed have expired.
+    """
+    pem = path.read_bytes()
+    can_sign = b"PRIVATE KEY" in pem
+    parsed = load_pem_private_key(pem, password=None) if can_sign else load_pem_public_key(pem)
+    if isinstance(parsed, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        algorithm = "RS256"
+    elif isinstance(parsed, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        algorithm = EC_ALGORITHMS.get(parsed.curve.name)
+    else:
+        algorithm = None
+    if algorithm is None:
+        raise ValueError("only RSA and P-256/384/521 EC keys are supported")
+    key = jwk.construct(pem, algorithm)
+    return SigningKey(
+        kid=path.name[:-len(".pem")],
+        algorithm=algorithm,
+        key=key,
+        public=key.public_key() if can_sign else key,
+        can_sign=can_sign,
+    )
+
+
+class KeyRing():
+    """
+    JWT keys shared by every worker and replica through a directory of PEM
+    files.
+
+    The newest private key signs; every key in the directory verifies, by
+    the `kid` header of the token. The directory is rescanned at most every
+    `reload_interval` seconds, so a key is rotated in by dropping a new file
+    next to the old ones and retired by deleting it, without a restart.
+
+    Without a directory tokens fall back to the shared `SECRET_KEY`, which
+    must then be set.
+    """
+
+    def __init__(self, directory: Optional[str], reload_interval: float):
+        self.directory = Path(directory) if directory else None
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._keys: Dict[str, SigningKey] = {}
+        self._signing: Optional[SigningKey] = None
+        self._jwks = b'{"keys":[]}'
+        self._fingerprint: Tuple = ()
+        self._checked_at = float("-inf")
+
+    def _scan(self) -> Tuple:
+        return tuple(sorted(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".pem")
+        ))
+
+    def reload(self, force: bool = False) -> None:
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        # Even forced rescans are spaced out so unknown kids cannot hammer the disk
+        if now - self._checked_at < (1.0 if force else self.reload_interval):
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                fingerprint = self._scan()
+            except OSError as e:
+                logger.error(f"cannot read JWT keys from {self.directory}: {e}")
+                return
+            if fingerprint == self._fingerprint:
+                return
+            keys: Dict[str, SigningKey] = {}
+            newest: List[Tuple[int, str]] = []
+            for name, mtime in fingerprint:
+                try:
+                    key = load_key(self.directory / name)
+                except (OSError, ValueError) as e:
+                    logger.error(f"skipping JWT key {name}: {e}")
+                    continue
+                keys[key.kid] = key
+                if key.can_sign:
+                    newest.append((mtime, key.kid))
+            if not newest:
+                # Keep signing with what we have rather than going dark
+                logger.error(f"no usable private key in {self.directory}, keeping the old key ring")
+                return
+            self._keys = keys
+            self._signing = keys[max(newest)[1]]
+            self._jwks = json.dumps({"keys": [
+                {**key.public.to_dict(), "kid": key.kid, "alg": key.algorithm, "use": "sig"}
+                for key in keys.values()
+            ]}, separators=(",", ":")).encode()
+            self._fingerprint = fingerprint
+            logger.info(f"loaded JWT keys {sorted(keys)}, signing with {self._signing.kid}")
+
+    def load(self) -> None:
+        """Load the keys at startup, failing loudly rather than signing with the fallback."""
+        if self.directory is None and not settings.SECRET_KEY:
+            # A key made up per process would only verify tokens from this worker
+            raise RuntimeError("set JWT_KEYS_DIR or SECRET_KEY to sign tokens with")
+        self.reload(force=True)
+        if self.directory is not None and self._signing is None:
+            raise RuntimeError(f"no usable JWT signing key in {self.directory}")
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        self.reload()
+        if self._signing is None:
+            return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ENCRYPT_ALGORITHM)
+        return jwt.encode(
+            claims,
+            self._signing.key,
+            algorithm=self._signing.algorithm,
+            headers={"kid": self._signing.kid},
+        )
+
+    def decode(self, token: str, typ: str) -> Dict[str, Any]:
+        """Verify `token` is a `typ` token and return its claims; raises `jwt.JWTError`."""
+        claims = self._decode(token)
+        if claims.get("typ") != typ:
+            raise jwt.JWTError(f"Not a {typ} token")
+        return claims
+
+    def _decode(self, token: str) -> Dict[str, Any]:
+        self.reload()
+        if self._signing is None:
+            return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ENCRYPT_ALGORITHM])
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid)
+        if key is None:
+            # Possibly signed by a replica that already picked up a new key
+            self.reload(force=True)
+            key = self._keys.get(kid)
+            if key is None:
+                raise jwt.JWTError(f"Unknown signing key: {kid}")
+        return jwt.decode(token, key.public, algorithms=[key.algorithm])
+
+    def jwks(self) -> bytes:
+        """The public keys as a serialized JWK Set."""
+        self.reload()
+        return self._jwks
+
+
+keyring = KeyRing(settings.JWT_KEYS_DIR, reload_interval=settings.JWT_KEYS_RELOAD_SECONDS)
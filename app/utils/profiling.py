@@ -0,0 +1,273 @@
+import cProfile
+import contextvars
+import hashlib
+import hmac
+import io
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+_current: contextvars.ContextVar = contextvars.ContextVar("profiled_queries", default=None)
+
+
+def sign(secret: str, method: str, path: str, timestamp: Optional[int] = None) -> str:
+    """Value of the X-Profile header that authorizes profiling `method path`."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    message = f"{timestamp}:{method.upper()}:{path}".encode()
+    return f"{timestamp}.{hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()}"
+
+
+def verify(secret: str, value: str, method: str, path: str, max_age: float) -> bool:
+    try:
+        timestamp = int(value.split(".", 1)[0])
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > max_age:
+        return False
+    return hmac.compare_digest(value, sign(secret, method, path, timestamp))
+
+
+class QueryStats():
+    """
+    SQL statements executed on behalf of one request. Repeats are keyed on a
+    digest of the parameters, so emails, password hashes and the like are
+    never kept, let alone written to a report.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self._started: List[float] = []
+
+    @property
+    def duplicates(self) -> int:
+        return sum(count - 1 for count in self.statements.values())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats._started.append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current.get()
+    if stats is not None and stats._started:
+        stats.seconds += time.perf_counter() - stats._started.pop()
+        stats.count += 1
+        digest = hashlib.sha256(repr(parameters).encode()).hexdigest()[:16]
+        stats.statements[(statement, digest)] += 1
+
+
+def _grown(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[tracemalloc.StatisticDiff]:
+    return [stat for stat in after.compare_to(before, "lineno") if stat.size_diff > 0]
+
+
+def install_query_hooks(engine: Engine) -> None:
+    """Count statements and DB time of profiled requests; a no-op for the rest."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfilingMiddleware():
+    """
+    Profiles single requests that carry a valid signed X-Profile header.
+
+    Such a request runs under cProfile and tracemalloc with its SQL
+    counted, and gets the summary back as X-Profile-* response headers. The
+    body is passed through as it comes; a response streamed in several
+    chunks has its headers sent before the summary is known, so it only gets
+    X-Profile-Id and the summary goes to the log and report. With
+    `output_dir` set, the cProfile stats (.prof) and a JSON report of top
+    functions, repeated statements (without their parameters) and
+    allocation growth are written there too, off the event loop. cProfile and tracemalloc see the whole process, so anything else
+    running on the event loop at the same time shows up as well; profile
+    on a quiet worker for clean numbers. For the same reason only one
+    request per process is profiled at a time, and another that asks while
+    one runs gets a 429.
+    """
+
+    def __init__(self, app: Any, secret: str, max_age: float = 300, output_dir: Optional[str] = None):
+        self.app = app
+        self.secret = secret
+        self.max_age = max_age
+        self.output_dir = Path(output_dir) if output_dir else None
+        self._profiling = False
+
+    def _wants_profile(self, scope: Dict[str, Any]) -> bool:
+        if scope["type"] != "http":
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return verify(
+                    self.secret, value.decode("latin-1"), scope["method"], scope["path"], self.max_age
+                )
+        return False
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if self._profiling:
+            response = JSONResponse(
+                {"detail": "Another request is being profiled, try again later"},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        self._profiling = True
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._profiling = False
+
+    async def _profile(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        path = scope["path"].strip("/").replace("/", "_")
+        now = time.time()
+        stamp = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now * 1000) % 1000:03d}"
+        profile_id = f"{stamp}-{scope['method']}-{path}"
+
+        queries = QueryStats()
+        token = _current.set(queries)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        result: Dict[str, Any] = {}
+        response_bytes = 0
+        response_start: Optional[Dict[str, Any]] = None
+        streaming = False
+
+        def finish() -> None:
+            if result:
+                return
+            profiler.disable()
+            result["elapsed"] = time.perf_counter() - started_at
+            result["after"] = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+        async def summarize() -> Dict[str, str]:
+            if "allocations" not in result:
+                result["allocations"] = await run_in_threadpool(_grown, before, result["after"])
+            return self._summary(result["elapsed"], queries, result["allocations"], response_bytes)
+
+        def with_headers(message: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+            return {
+                **message,
+                "headers": list(message.get("headers", [])) + [
+                    (name.encode(), value.encode()) for name, value in headers.items()
+                ],
+            }
+
+        async def observe(message: Dict[str, Any]) -> None:
+            nonlocal response_bytes, response_start, streaming
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows whether the summary can still go in
+                response_start = message
+                return
+            if message["type"] == "http.response.body" and response_start is not None:
+                start, response_start = response_start, None
+                response_bytes += len(message.get("body", b""))
+                if message.get("more_body", False):
+                    streaming = True
+                    headers = {"x-profile-id": profile_id} if self.output_dir is not None else {}
+                    await send(with_headers(start, headers))
+                else:
+                    # The whole body is in this one message, so the request is done
+                    finish()
+                    headers = await summarize()
+                    if self.output_dir is not None:
+                        headers["x-profile-id"] = profile_id
+                    await send(with_headers(start, headers))
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        started_at = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, observe)
+        finally:
+            finish()
+            _current.reset(token)
+
+        summary = await summarize()
+        if streaming:
+            logger.info(f"profiled streamed response {profile_id}: {summary}")
+        if self.output_dir is not None:
+            await run_in_threadpool(
+                self._dump, profile_id, scope, profiler, queries, result["allocations"], summary
+            )
+
+    @staticmethod
+    def _summary(
+        elapsed: float,
+        queries: QueryStats,
+        allocations: List[tracemalloc.StatisticDiff],
+        response_bytes: int,
+    ) -> Dict[str, str]:
+        return {
+            "x-profile-total-ms": f"{elapsed * 1000:.2f}",
+            "x-profile-queries": str(queries.count),
+            "x-profile-db-ms": f"{queries.seconds * 1000:.2f}",
+            "x-profile-duplicate-queries": str(queries.duplicates),
+            "x-profile-alloc-kb": f"{sum(s.size_diff for s in allocations) / 1024:.1f}",
+            "x-profile-response-bytes": str(response_bytes),
+        }
+
+    def _dump(
+        self,
+        profile_id: str,
+        scope: Dict[str, Any],
+        profiler: cProfile.Profile,
+        queries: QueryStats,
+        allocations: List[tracemalloc.StatisticDiff],
+        summary: Dict[str, str],
+    ) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(self.output_dir / f"{profile_id}.prof")
+
+        top = io.StringIO()
+        pstats.Stats(profiler, stream=top).sort_stats("cumulative").print_stats(30)
+        statements: Dict[str, int] = Counter()
+        for (statement, _), count in queries.statements.items():
+            statements[statement] += count
+        report = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "summary": summary,
+            "statements": [
+                {"sql": sql, "count": count} for sql, count in statements.most_common()
+            ],
+            "duplicate_statements": [
+                {"sql": sql, "count": count}
+                for (sql, _), count in queries.statements.items()
+                if count > 1
+            ],
+            "allocations": [
+                {"where": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in allocations[:20]
+            ],
+            "top_functions": top.getvalue(),
+        }
+        with open(self.output_dir / f"{profile_id}.json", "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"wrote request profile {profile_id} to {self.output_dir}")
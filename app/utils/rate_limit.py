@@ -0,0 +1,196 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from . import metrics
+from .cache import FakeKeyValueClient
+
+# Non-empty count/seconds pairs, e.g. "10/60"
+Limit = Tuple[int, float]
+
+RATE_LIMITED = metrics.counter(
+    "rate_limit_rejections", "Requests rejected by the rate limiter", ["route", "key"]
+)
+
+
+def parse_limit(value: Optional[str]) -> Optional[Limit]:
+    """Parse "<count>/<seconds>", already checked by Settings; empty means unlimited."""
+    if not value:
+        return None
+    count, window = value.split("/", 1)
+    return int(count), float(window)
+
+
+def _retry_after(previous: int, current: int, elapsed: float, limit: Limit) -> float:
+    """Seconds until the sliding count of a key that is over `limit` leaves room for one more attempt."""
+    count, window = limit
+    if current < count and previous:
+        # Enough of the previous window slides out before this one ends
+        return max(0.0, window * (1 - (count - current - 1) / previous) - elapsed)
+    # Only once the current window has become the previous one
+    return window - elapsed + window * (1 - (count - 1) / max(current, 1))
+
+
+class RateLimitBackend():
+    """
+    Counts attempts per key in fixed windows and weighs the previous window
+    by how much of it still overlaps the sliding one, so a key costs two
+    counters however many attempts it makes.
+    """
+
+    async def hit(self, key: str, limit: Limit) -> float:
+        """Count an attempt; returns 0 if it is allowed, else seconds to wait."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class LocalRateLimitBackend(RateLimitBackend):
+    """Per worker; the least recently seen keys are evicted beyond `max_keys`."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> [window index, previous window count, current window count]
+        self._windows: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: Limit) -> float:
+        count, window = limit
+        now = time.time()
+        index = int(now // window)
+        entry = self._windows.get(key)
+        if entry is None or entry[0] < index - 1:
+            entry = self._windows[key] = [index, 0, 0]
+        elif entry[0] == index - 1:
+            entry[:] = [index, entry[2], 0]
+        self._windows.move_to_end(key)
+        entry[2] += 1
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+            self.evictions += 1
+
+        elapsed = now - index * window
+        if entry[1] * (1 - elapsed / window) + entry[2] <= count:
+            return 0.0
+        return _retry_after(entry[1], entry[2], elapsed, limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._windows), "evictions": self.evictions}
+
+
+class KeyValueRateLimitBackend(RateLimitBackend):
+    """
+    Shared between workers on an external key-value store.
+
+    `client` needs async `get(key)`, `incr(key)` and `expire(key, seconds)`,
+    as redis.asyncio has; expired windows are left to the store to drop.
+    """
+
+    def __init__(self, client: Any, prefix: str = "identity:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def hit(self, key: str, limit: Limit) -> float:
+        count, window = limit
+        now = time.time()
+        index = int(now // window)
+        current_key = f"{self.prefix}{key}:{index}"
+        current = await self.client.incr(current_key)
+        if current == 1:
+            await self.client.expire(current_key, math.ceil(2 * window))
+        previous = int(await self.client.get(f"{self.prefix}{key}:{index - 1}") or 0)
+
+        elapsed = now - index * window
+        if previous * (1 - elapsed / window) + current <= count:
+            return 0.0
+        return _retry_after(previous, current, elapsed, limit)
+
+
+class RateLimiter():
+    """
+    Limits attempts at expensive routes by client IP and by target email
+    from that IP.
+
+    Every attempt counts, rejected ones included, so a client that keeps
+    hammering stays locked out instead of getting a request through each
+    time the window slides. The email limit is kept per IP as well, so
+    that anyone who knows an address cannot lock its owner out.
+    """
+
+    def __init__(self, backend: RateLimitBackend, routes: Dict[str, Dict[str, Optional[Limit]]]):
+        self.backend = backend
+        self.routes = routes
+
+    @staticmethod
+    def client_ip(request: Request) -> str:
+        if settings.RATE_LIMIT_TRUST_FORWARDED:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",", 1)[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, route: str, request: Request, email: Optional[str] = None) -> None:
+        """Raise a 429 with Retry-After if `route` was tried too often from here or for `email`."""
+        limits = self.routes.get(route, {})
+        ip = self.client_ip(request)
+        keys = [("ip", ip)]
+        if email:
+            keys.append(("email", f"{email.lower()}:{ip}"))
+        retry_after = 0.0
+        for kind, value in keys:
+            limit = limits.get(kind)
+            if limit is not None:
+                wait = await self.backend.hit(f"{route}:{kind}:{value}", limit)
+                if wait:
+                    RATE_LIMITED.inc(route=route, key=kind)
+                    retry_after = max(retry_after, wait)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+
+def build_rate_limiter(backend: str, *, url: Optional[str], max_keys: int) -> Optional[RateLimiter]:
+    routes = {
+        "login": {
+            "ip": parse_limit(settings.RATE_LIMIT_LOGIN_IP),
+            "email": parse_limit(settings.RATE_LIMIT_LOGIN_EMAIL),
+        },
+        "signup": {
+            "ip": parse_limit(settings.RATE_LIMIT_SIGNUP_IP),
+            "email": parse_limit(settings.RATE_LIMIT_SIGNUP_EMAIL),
+        },
+        "reset": {
+            "ip": parse_limit(settings.RATE_LIMIT_RESET_IP),
+            "email": parse_limit(settings.RATE_LIMIT_RESET_EMAIL),
+        },
+    }
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return RateLimiter(LocalRateLimitBackend(max_keys=max_keys), routes)
+    if backend == "fake":
+        return RateLimiter(KeyValueRateLimitBackend(FakeKeyValueClient()), routes)
+    if backend == "redis":
+        # Optional dependency, only needed when the limits are shared between workers
+        from redis import asyncio as aioredis
+
+        return RateLimiter(KeyValueRateLimitBackend(aioredis.from_url(url)), routes)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+rate_limiter = build_rate_limiter(
+    settings.RATE_LIMIT_BACKEND,
+    url=settings.RATE_LIMIT_URL,
+    max_keys=settings.RATE_LIMIT_MAX_KEYS,
+)
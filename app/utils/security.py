@@ -1,11 +1,41 @@
-from jose import jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+import uuid
+from typing import Any, List, Tuple, Union, Optional
 
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_pwd_context() -> CryptContext:
+    """
+    The one context every password is hashed and verified with.
+
+    New hashes use the first of PASSWORD_SCHEMES at the configured cost;
+    hashes in the other schemes, or at any other cost, still verify but
+    report `needs_update` so they get rehashed on the next login.
+    """
+    schemes = [scheme.strip() for scheme in settings.PASSWORD_SCHEMES.split(",")]
+    if "argon2" in schemes:
+        from passlib.hash import argon2
+
+        if not argon2.has_backend():
+            raise RuntimeError("argon2 in PASSWORD_SCHEMES needs the argon2-cffi package")
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__rounds=settings.BCRYPT_ROUNDS,
+        bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+        bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+        argon2__type="ID",
+        argon2__rounds=settings.ARGON2_TIME_COST,
+        argon2__min_rounds=settings.ARGON2_TIME_COST,
+        argon2__max_rounds=settings.ARGON2_TIME_COST,
+        argon2__memory_cost=settings.ARGON2_MEMORY_KIB,
+        argon2__parallelism=settings.ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = build_pwd_context()
 
 
 def create_access_token(
@@ -18,8 +48,10 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ENCRYPT_ALGORITHM)
+    from .keyring import ACCESS_TOKEN, keyring
+
+    to_encode = {"exp": expire, "sub": str(subject), "jti": uuid.uuid4().hex, "typ": ACCESS_TOKEN}
+    encoded_jwt = keyring.encode(to_encode)
     return encoded_jwt
 
 def verify_password(
@@ -28,15 +60,31 @@ def verify_password(
 ) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_password_needs_update(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, bool]:
+    """Whether the password matches, and whether its hash is due to be redone."""
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, False
+    return True, pwd_context.needs_update(hashed_password)
+
+def load_hash_backend() -> str:
+    """Load the native backend of the default scheme; returns its name."""
+    return pwd_context.handler().get_backend()
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def get_password_hashes(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
 def generate_password_reset_token(email: str) -> str:
+    from .keyring import PASSWORD_RESET_TOKEN, keyring
+
     delta = timedelta(hours=settings.EMAIL_RESET_TOKEN_EXPIRE_HOURS)
     now = datetime.utcnow()
     expires = now + delta
     exp = expires.timestamp()
-    encoded_jwt = jwt.encode(
-        {"exp": exp, "nbf": now, "sub": email}, settings.SECRET_KEY, algorithm=settings.ENCRYPT_ALGORITHM,
-    )
+    encoded_jwt = keyring.encode({"exp": exp, "nbf": now, "sub": email, "typ": PASSWORD_RESET_TOKEN})
     return encoded_jwt
\ No newline at end of file
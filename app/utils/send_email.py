@@ -1,46 +1,66 @@
 from pathlib import Path
 from emails.template import JinjaTemplate
-from typing import Any, Dict
+from typing import Any, Dict, Union
 
 from app.core.config import settings
+from .email_queue import OutgoingEmail, email_queue, smtp_options
 
 import emails
 import logging
 
+TEMPLATE_NAMES = ("new_account.html", "reset_password.html", "test_email.html")
+
+_templates: Dict[str, JinjaTemplate] = {}
+
+
+def load_templates() -> None:
+    """Read and compile the email templates once, at startup."""
+    for name in TEMPLATE_NAMES:
+        with open(Path(settings.EMAIL_TEMPLATES_DIR) / name) as f:
+            template = JinjaTemplate(f.read())
+        template.template  # compile now rather than on the first send
+        _templates[name] = template
+
+
+def get_template(name: str) -> JinjaTemplate:
+    if name not in _templates:
+        load_templates()
+    return _templates[name]
+
 
 def send_email(
     email_to: str,
     subject_template: str = "",
-    html_template: str = "",
+    html_template: Union[str, JinjaTemplate] = "",
     environment: Dict[str, Any] = {},
 ) -> None:
+    """
+    Send an email, through the delivery queue when it is running (inside the
+    app) and synchronously otherwise (scripts).
+    """
     assert settings.EMAILS_ENABLED, "no provided configuration for email variables"
+    if not isinstance(html_template, JinjaTemplate):
+        html_template = JinjaTemplate(html_template)
     message = emails.Message(
-        subject=JinjaTemplate(subject_template),
-        html=JinjaTemplate(html_template),
+        subject=subject_template,
+        html=html_template,
         mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, render=environment, smtp=smtp_options)
+    if email_queue.running:
+        email_queue.enqueue(OutgoingEmail(message, email_to, environment))
+        return
+    response = message.send(to=email_to, render=environment, smtp=smtp_options())
     logging.info(f"send email result: {response}")
 
 
 def send_new_account_email(email_to: str, username: str, password: str) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - New account for user {username}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "new_account.html") as f:
-        template_str = f.read()
     link = settings.SERVER_HOST
     send_email(
         email_to=email_to,
         subject_template=subject,
-        html_template=template_str,
+        html_template=get_template("new_account.html"),
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": username,
@@ -54,14 +74,12 @@ def send_new_account_email(email_to: str, username: str, password: str) -> None:
 def send_reset_password_email(email_to: str, email: str, token: str) -> None:
     project_name = settings.PROJECT_NAME
     subject = f"{project_name} - Password recovery for user {email}"
-    with open(Path(settings.EMAIL_TEMPLATES_DIR) / "reset_password.html") as f:
-        template_str = f.read()
     server_host = settings.SERVER_HOST
     link = f"{server_host}/reset-password?token={token}"
     send_email(
         email_to=email_to,
         subject_template=subject,
-        html_template=template_str,
+        html_template=get_template("reset_password.html"),
         environment={
             "project_name": settings.PROJECT_NAME,
             "username": email,
@@ -0,0 +1,65 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.schemas.token import TokenPayload
+from .cache import TTLCache
+
+CachedToken = Tuple[TokenPayload, Dict[str, Any]]
+
+
+class TokenCache():
+    """
+    Remembers tokens `get_current_user` already validated.
+
+    Entries hold the decoded payload and a snapshot of the user's columns
+    (without the password hash), keyed by a digest of the token so raw
+    tokens never sit in memory. They live until the token's `exp` or the
+    cache TTL, whichever comes first, and are dropped as soon as the user
+    is updated or removed through CRUDUser.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl, on_evict=self._forget)
+        self._keys_by_user: Dict[Any, Set[str]] = {}
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[CachedToken]:
+        return self._cache.get(self.key(token))
+
+    def set(
+        self, token: str, payload: TokenPayload, user: Dict[str, Any], exp: Optional[float]
+    ) -> None:
+        ttl = None if exp is None else exp - time.time()
+        key = self.key(token)
+        self._keys_by_user.setdefault(user["id"], set()).add(key)
+        self._cache.set(key, (payload, user), ttl=ttl)
+
+    def _forget(self, key: str, value: CachedToken) -> None:
+        user_id = value[1]["id"]
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+    def invalidate_user(self, user_id: Any) -> None:
+        for key in self._keys_by_user.pop(user_id, ()):
+            self._cache.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "evictions": self._cache.evictions,
+        }
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
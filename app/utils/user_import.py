@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import logging
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, schemas
+from app.db.session import SessionLocal
+from .hasher import hasher
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+
+# A chunk is inserted with one statement, whose bind parameters asyncpg caps
+# at 32767; each user row takes one per column of the INSERT in _import_chunk
+MAX_BIND_PARAMS = 32767
+PARAMS_PER_ROW = 5
+MAX_CHUNK_SIZE = MAX_BIND_PARAMS // PARAMS_PER_ROW
+
+
+def parse_rows(lines: Iterable[str], format: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (row number, raw record) pairs from CSV (with a header row) or
+    NDJSON lines. Records that cannot be parsed are yielded as exceptions.
+    """
+    if format == "csv":
+        for row_no, record in enumerate(csv.DictReader(lines), start=1):
+            yield row_no, {k: v for k, v in record.items() if v not in (None, "")}
+    elif format == "ndjson":
+        for row_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_no, json.loads(line)
+            except ValueError as e:
+                yield row_no, e
+    else:
+        raise ValueError(f"Unknown import format: {format}")
+
+
+def parse_file(content: bytes, format: str) -> List[Tuple[int, Any]]:
+    """Every row of an uploaded file, parsed; raises UnicodeDecodeError unless it is UTF-8."""
+    lines = io.StringIO(content.decode("utf-8-sig"), newline="")
+    return list(parse_rows(lines, format))
+
+
+class UserImporter():
+    """
+    Bulk-creates users in chunked transactions.
+
+    Each chunk is validated, checked for duplicate emails within itself and
+    against the database with one set-wise query, hashed across the
+    password pool and loaded with a single multi-row INSERT.
+    """
+
+    def __init__(self, chunk_size: int = 1000, max_errors: int = 1000):
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.result = schemas.UserImportResult()
+
+    def _fail(self, row_no: int, email: Optional[str], error: str) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append(
+                schemas.UserImportError(row=row_no, email=email, error=error)
+            )
+
+    async def run(self, rows: Iterable[Tuple[int, Any]]) -> schemas.UserImportResult:
+        chunk: List[Tuple[int, Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                await self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            await self._import_chunk(chunk)
+        return self.result
+
+    def _validate(self, chunk: List[Tuple[int, Any]]) -> List[Tuple[int, schemas.UserCreate]]:
+        valid: List[Tuple[int, schemas.UserCreate]] = []
+        # Only the chunk is tracked so memory stays flat; duplicates of rows
+        # from earlier chunks are caught as already registered instead
+        seen: Set[str] = set()
+        for row_no, record in chunk:
+            if isinstance(record, Exception):
+                self._fail(row_no, None, f"Unreadable row: {record}")
+                continue
+            try:
+                user_in = schemas.UserCreate(**record)
+            except (ValidationError, TypeError) as e:
+                email = record.get("email") if isinstance(record, dict) else None
+                self._fail(row_no, email, str(e).replace("\n", " "))
+                continue
+            if user_in.email in seen:
+                self._fail(row_no, user_in.email, "Duplicate email in import")
+                continue
+            seen.add(user_in.email)
+            valid.append((row_no, user_in))
+        return valid
+
+    async def _import_chunk(self, chunk: List[Tuple[int, Any]]) -> None:
+        # Validation is CPU-bound, so it runs off the event loop
+        valid = await run_in_threadpool(self._validate, chunk)
+        if not valid:
+            return
+
+        async with SessionLocal() as db:
+            existing = await crud.user.get_existing_emails(
+                db, emails=[user_in.email for _, user_in in valid]
+            )
+        pending = []
+        for row_no, user_in in valid:
+            if user_in.email in existing:
+                self._fail(row_no, user_in.email, "Email already registered")
+            else:
+                pending.append((row_no, user_in))
+        if not pending:
+            return
+
+        # Hash before opening the write transaction so no connection idles meanwhile
+        hashed = await hasher.hash_many([user_in.password for _, user_in in pending])
+        async with SessionLocal() as db:
+            created = await crud.user.bulk_insert(db, rows=[
+                {
+                    "email": user_in.email,
+                    "hashed_password": hashed_password,
+                    "nickname": user_in.nickname,
+                    "is_active": user_in.is_active,
+                    "is_superuser": user_in.is_superuser,
+                }
+                for (_, user_in), hashed_password in zip(pending, hashed)
+            ])
+            await db.commit()
+
+        created_emails = {email for _, email in created}
+        for row_no, user_in in pending:
+            # Taken by a concurrent signup between the check and the insert
+            if user_in.email not in created_emails:
+                self._fail(row_no, user_in.email, "Email already registered")
+        self.result.created += len(created)
+        logger.info(f"imported {self.result.created} users, {self.result.failed} failed")
+
+
+async def import_users(
+    lines: Iterable[str], format: str, chunk_size: int = 1000, max_errors: int = 1000
+) -> schemas.UserImportResult:
+    importer = UserImporter(chunk_size=chunk_size, max_errors=max_errors)
+    return await importer.run(parse_rows(lines, format))
@@ -0,0 +1,2 @@
+from .outbox import outbox_dispatcher
+from .revocation import revocation_index
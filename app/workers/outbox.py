@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from app import crud, schemas
+from app.core.config import settings
+from app.crud.outbox import CREATE_CONSUMER_TOPIC
+from app.db.session import SessionLocal
+from app.deps.cash_service import CashService
+from app.models.outbox import Outbox
+from app.utils import create_access_token
+
+logger = logging.getLogger(__name__)
+
+# Client errors that may go away on their own; any other 4xx is final
+RETRYABLE_CLIENT_STATUSES = {408, 429}
+
+
+class OutboxDispatcher():
+    """
+    Delivers cash consumer outbox rows in the background.
+
+    Rows are leased in batches, delivered with no transaction or connection
+    held, and deleted once the cash service accepts them. Delivery is
+    at-least-once: a crash before the rows are marked means they are sent
+    again when their lease runs out.
+
+    A row the cash service rejects with a 4xx that will not change on a
+    retry, or that has used up `max_attempts`, is marked failed and kept
+    out of the backlog.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        poll_interval: float,
+        max_backoff: float,
+        lease: float,
+        max_attempts: int,
+        backlog_interval: float,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.lease = timedelta(seconds=lease)
+        self.max_attempts = max_attempts
+        self.backlog_interval = backlog_interval
+        self.cash_service = CashService()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._delivered = 0
+        self._failed = 0
+        self._given_up = 0
+        self._pending = 0
+        self._dead = 0
+        self._backlog_checked_at = float("-inf")
+        self._lag_seconds = 0.0
+        self._last_run_at = 0.0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.dispatch_once()
+            except Exception:
+                logger.exception("outbox dispatch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def dispatch_once(self) -> int:
+        async with SessionLocal() as db:
+            rows = await crud.outbox.lease_batch(
+                db, topic=CREATE_CONSUMER_TOPIC, limit=self.batch_size, lease=self.lease
+            )
+        results = await asyncio.gather(
+            *[self._deliver(row) for row in rows], return_exceptions=True
+        )
+
+        async with SessionLocal() as db:
+            delivered = []
+            for row, error in zip(rows, results):
+                if error is None:
+                    delivered.append(row.id)
+                    continue
+                self._failed += 1
+                if not self._retryable(error) or row.attempts >= self.max_attempts:
+                    self._given_up += 1
+                    logger.error(
+                        f"outbox row {row.id} given up after {row.attempts} attempts: {error!r}"
+                    )
+                    await crud.outbox.mark_dead(db, id=row.id, error=repr(error))
+                    continue
+                logger.warning(f"outbox row {row.id} delivery failed: {error!r}")
+                await crud.outbox.mark_failed(
+                    db, id=row.id, error=repr(error), retry_in=self._backoff(row.attempts - 1)
+                )
+            await crud.outbox.mark_delivered(db, ids=delivered)
+            await db.commit()
+            self._delivered += len(delivered)
+
+        if time.monotonic() - self._backlog_checked_at >= self.backlog_interval:
+            await self._refresh_backlog()
+        self._last_run_at = time.time()
+        return len(rows)
+
+    async def _refresh_backlog(self) -> None:
+        async with SessionLocal() as db:
+            pending, oldest, dead = await crud.outbox.get_backlog(
+                db, topic=CREATE_CONSUMER_TOPIC
+            )
+        self._pending = pending
+        self._dead = dead
+        self._lag_seconds = (
+            (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        )
+        self._backlog_checked_at = time.monotonic()
+
+    async def _deliver(self, row: Outbox) -> None:
+        token = create_access_token(row.user_id, expires_delta=timedelta(minutes=5))
+        try:
+            await self.cash_service.create_consumer(
+                token, schemas.ConsumerCreate(**row.payload)
+            )
+        except HTTPException as e:
+            # The consumer can only exist already if an earlier attempt got
+            # through before its answer was lost; on a first attempt a 409
+            # is a real conflict and is left to fail the row
+            if e.status_code != 409 or row.attempts <= 1:
+                raise
+
+    @staticmethod
+    def _retryable(error: BaseException) -> bool:
+        if isinstance(error, HTTPException) and 400 <= error.status_code < 500:
+            return error.status_code in RETRYABLE_CLIENT_STATUSES
+        return True
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.max_backoff, self.poll_interval * 2 ** attempts)
+        return timedelta(seconds=random.uniform(delay / 2, delay))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending,
+            "lag_seconds": self._lag_seconds,
+            "delivered": self._delivered,
+            "failed": self._failed,
+            "given_up": self._given_up,
+            "dead": self._dead,
+            "last_run_at": self._last_run_at,
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_SECONDS,
+    max_backoff=settings.OUTBOX_MAX_BACKOFF_SECONDS,
+    lease=settings.OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    backlog_interval=settings.OUTBOX_BACKLOG_REFRESH_SECONDS,
+)
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import BigInteger, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key held by whichever worker is pruning
+PRUNE_LOCK_ID = 0x7265766f6b65
+
+
+class RevocationIndex():
+    """
+    In-memory index of revoked access token ids.
+
+    A bloom filter rebuilt from the revoked_token table every
+    `sync_interval` seconds answers almost every check on the CPU alone;
+    only ids it may contain are confirmed against the table, so false
+    positives cost one query and never reject a valid token. Revocations
+    made by this worker are visible to it at once, those made elsewhere
+    after the next sync.
+
+    Syncing only reads. Expired rows are deleted separately, every
+    `prune_interval` seconds, and only by a worker that gets the advisory
+    lock; the others skip that round.
+    """
+
+    def __init__(
+        self, sync_interval: float, capacity: int, error_rate: float, prune_interval: float
+    ):
+        self.sync_interval = sync_interval
+        self.prune_interval = prune_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        # Revoked here since the running sync started, so its rebuild keeps them
+        self._recent: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._checks = 0
+        self._confirmations = 0
+        self._revoked_hits = 0
+        self._last_sync_at = 0.0
+        # Spread out so that workers started together do not all try at once
+        self._next_prune_at = time.monotonic() + random.uniform(0, prune_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.sync()
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("revocation index sync failed")
+            if time.monotonic() >= self._next_prune_at:
+                self._next_prune_at = time.monotonic() + self.prune_interval
+                try:
+                    await self.prune()
+                except Exception:
+                    logger.exception("revoked token pruning failed")
+
+    async def sync(self) -> None:
+        self._recent = set()
+        async with SessionLocal() as db:
+            jtis = await crud.revoked_token.get_active_jtis(db)
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        for jti in self._recent:
+            bloom.add(jti)
+        self._filter = bloom
+        self._last_sync_at = time.time()
+
+    async def prune(self) -> bool:
+        """Delete expired rows, which can no longer match a valid token; False if skipped."""
+        async with SessionLocal() as db:
+            lock = func.pg_try_advisory_xact_lock(literal(PRUNE_LOCK_ID, BigInteger))
+            if not (await db.execute(select(lock))).scalar():
+                return False
+            await crud.revoked_token.prune(db)
+            await crud.refresh_token.prune(db)
+            await db.commit()
+        return True
+
+    def add(self, jti: str) -> None:
+        """Record a revocation already committed to the revoked_token table."""
+        self._filter.add(jti)
+        self._recent.add(jti)
+
+    async def is_revoked(self, db: AsyncSession, jti: Optional[str]) -> bool:
+        self._checks += 1
+        if jti is None or jti not in self._filter:
+            return False
+        self._confirmations += 1
+        revoked = await crud.revoked_token.exists(db, jti=jti)
+        self._revoked_hits += revoked
+        return revoked
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self._filter.count,
+            "checks": self._checks,
+            "confirmations": self._confirmations,
+            "revoked": self._revoked_hits,
+            "last_sync_at": self._last_sync_at,
+        }
+
+
+revocation_index = RevocationIndex(
+    sync_interval=settings.REVOCATION_SYNC_SECONDS,
+    capacity=settings.REVOCATION_INDEX_CAPACITY,
+    error_rate=settings.REVOCATION_INDEX_ERROR_RATE,
+    prune_interval=settings.REVOCATION_PRUNE_SECONDS,
+)
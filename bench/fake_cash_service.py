@@ -0,0 +1,92 @@
+"""
+Stand-in for the cash service that accepts every consumer creation.
+
+    python -m bench.fake_cash_service [--port 8765] [--latency-ms 5] [--failure-rate 0]
+
+Point CASH_SERVICE_BASE_URL at it so the outbox dispatcher has somewhere
+to deliver to during a load test. `--failure-rate` answers that share of
+calls with a 503 to exercise retries and the circuit breaker.
+"""
+import argparse
+import asyncio
+import logging
+import random
+from typing import Optional
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FakeCashService():
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        latency: float = 0.005,
+        failure_rate: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _create_consumer(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        await request.read()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            self.failures += 1
+            return web.json_response({"detail": "unavailable"}, status=503)
+        return web.json_response({"cash": 0})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/api/v1/cash/consumers", self._create_consumer)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake cash service for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> None:
+    service = FakeCashService(args.host, args.port, args.latency_ms / 1000, args.failure_rate)
+    await service.start()
+    logger.info(f"fake cash service listening on {args.host}:{args.port}")
+    try:
+        while True:
+            count = service.requests
+            await asyncio.sleep(10)
+            if service.requests != count:
+                logger.info(f"{service.requests} requests, {service.failures} failed")
+    finally:
+        await service.stop()
+
+
+def main() -> None:
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
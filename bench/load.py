@@ -0,0 +1,375 @@
+"""
+Load test of the identity hot paths.
+
+    python -m bench.load [--concurrency 16] [--duration 10] [--scenarios login,me,...]
+                         [--output run.json] [--compare baseline.json]
+
+Boots the app under uvicorn on `--port` with a fake cash service and an
+SMTP sink standing in for its neighbours (or drives `--base-url` if a
+server is already running), seeds bench users through the admin import
+endpoint and runs each scenario in turn at the given concurrency:
+
+    login      POST /access-token
+    me         GET  /users/me
+    signup     POST /users/open
+    update_me  PUT  /users/me
+    list       GET  /users
+
+Postgres has no in-process stand-in that behaves like it under load, so
+the app talks to the database configured in the environment, as it would
+in production. For every scenario the JSON report has throughput, client
+side latency percentiles and the SQL statements per request counted by
+the app's /metrics, keyed so runs from different commits can be diffed
+with `--compare`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import secrets
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app.script.smtp_sink import SMTPSink
+from bench.fake_cash_service import FakeCashService
+
+API = "/api/v1"
+PASSWORD = "bench-password"
+
+# Scenario -> the method of the requests it sends, to pick its series out of /metrics
+SCENARIOS = {
+    "login": "POST",
+    "me": "GET",
+    "signup": "POST",
+    "update_me": "PUT",
+    "list": "GET",
+}
+
+SAMPLE_RE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class Bench():
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, args: argparse.Namespace):
+        self.session = session
+        self.base_url = base_url
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.admin_token: Optional[str] = None
+        self.emails: List[str] = []
+        self.tokens: List[str] = []
+        self._signups = 0
+
+    async def _login(self, email: str, password: str) -> Tuple[int, Optional[str]]:
+        async with self.session.post(
+            f"{self.base_url}{API}/access-token",
+            data={"username": email, "password": password},
+        ) as resp:
+            if resp.status != 200:
+                await resp.read()
+                return resp.status, None
+            return resp.status, (await resp.json())["access_token"]
+
+    async def seed(self) -> None:
+        status, self.admin_token = await self._login(self.args.admin_email, self.args.admin_password)
+        if self.admin_token is None:
+            raise RuntimeError(f"cannot log in as {self.args.admin_email}: {status}")
+        self.emails = [f"bench-{self.run_id}-{i}@example.com" for i in range(self.args.users)]
+        body = "".join(
+            json.dumps({"email": email, "password": PASSWORD, "nickname": f"b{i}"}) + "\n"
+            for i, email in enumerate(self.emails)
+        )
+        form = aiohttp.FormData()
+        form.add_field("file", body, filename="bench.ndjson")
+        async with self.session.post(
+            f"{self.base_url}{API}/users/import",
+            data=form,
+            headers={"Authorization": f"Bearer {self.admin_token}"},
+        ) as resp:
+            result = await resp.json()
+            if resp.status != 200 or result.get("failed"):
+                raise RuntimeError(f"seeding bench users failed: {resp.status} {result}")
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def login(email: str) -> Optional[str]:
+            async with semaphore:
+                return (await self._login(email, PASSWORD))[1]
+
+        self.tokens = [t for t in await asyncio.gather(*map(login, self.emails)) if t]
+
+    async def scrape(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Request counts and SQL statements so far, by (method, route)."""
+        headers = {}
+        if self.args.metrics_token:
+            headers["Authorization"] = f"Bearer {self.args.metrics_token}"
+        async with self.session.get(f"{self.base_url}/metrics", headers=headers) as resp:
+            resp.raise_for_status()
+            text = await resp.text()
+        series: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for line in text.splitlines():
+            match = SAMPLE_RE.match(line)
+            if match is None:
+                continue
+            name, labels, value = match.groups()
+            if name not in ("http_request_duration_seconds_count", "http_request_db_statements_total"):
+                continue
+            labels = dict(LABEL_RE.findall(labels))
+            entry = series.setdefault((labels["method"], labels["route"]), {"requests": 0, "statements": 0})
+            entry["requests" if name.endswith("_count") else "statements"] += float(value)
+        return series
+
+    def _auth(self, token: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {token}"}
+
+    def request(self, scenario: str) -> Callable[[], Awaitable[int]]:
+        session, base = self.session, f"{self.base_url}{API}"
+
+        async def send(method: str, url: str, **kwargs: Any) -> int:
+            async with session.request(method, url, **kwargs) as resp:
+                await resp.read()
+                return resp.status
+
+        if scenario == "login":
+            return lambda: send(
+                "POST", f"{base}/access-token",
+                data={"username": random.choice(self.emails), "password": PASSWORD},
+            )
+        if scenario == "me":
+            return lambda: send("GET", f"{base}/users/me", headers=self._auth(random.choice(self.tokens)))
+        if scenario == "signup":
+            def signup() -> Awaitable[int]:
+                self._signups += 1
+                return send("POST", f"{base}/users/open", json={
+                    "email": f"bench-{self.run_id}-signup-{self._signups}@example.com",
+                    "password": PASSWORD,
+                    "nickname": "signup",
+                })
+            return signup
+        if scenario == "update_me":
+            return lambda: send(
+                "PUT", f"{base}/users/me",
+                headers=self._auth(random.choice(self.tokens)),
+                json={"nickname": f"n{random.randrange(10 ** 6)}"},
+            )
+        if scenario == "list":
+            return lambda: send("GET", f"{base}/users?limit=100", headers=self._auth(self.admin_token))
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    async def run_scenario(self, scenario: str) -> Dict[str, Any]:
+        request = self.request(scenario)
+        for _ in range(self.args.warmup):
+            await request()
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        errors = 0
+        budget = self.args.requests
+        deadline = time.monotonic() + self.args.duration
+
+        async def worker() -> None:
+            nonlocal budget, errors
+            while time.monotonic() < deadline and (budget is None or budget > 0):
+                if budget is not None:
+                    budget -= 1
+                started_at = time.perf_counter()
+                try:
+                    status = str(await request())
+                except aiohttp.ClientError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started_at)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not status.startswith("2"):
+                    errors += 1
+
+        before = await self.scrape()
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        elapsed = time.perf_counter() - started_at
+        after = await self.scrape()
+
+        method = SCENARIOS[scenario]
+        requests = statements = 0.0
+        for (series_method, route), entry in after.items():
+            if series_method != method or route == "/metrics":
+                continue
+            previous = before.get((series_method, route), {"requests": 0, "statements": 0})
+            requests += entry["requests"] - previous["requests"]
+            statements += entry["statements"] - previous["statements"]
+
+        latencies.sort()
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 3)
+
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": statuses,
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "queries_per_request": round(statements / requests, 2) if requests else None,
+        }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of every figure against `baseline`, in percent."""
+    changes: Dict[str, Any] = {}
+    for scenario, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if base is None:
+            continue
+        changes[scenario] = {
+            key: round((result[key] - base[key]) / base[key] * 100, 1)
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+            if result.get(key) is not None and base.get(key)
+        }
+    return changes
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_app(args: argparse.Namespace) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "CASH_SERVICE_BASE_URL": f"http://127.0.0.1:{args.cash_port}",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(args.smtp_port),
+        "SMTP_TLS": "false",
+        "EMAILS_FROM_EMAIL": os.getenv("EMAILS_FROM_EMAIL", "bench@example.com"),
+        "EMAIL_TEMPLATES_DIR": os.getenv(
+            "EMAIL_TEMPLATES_DIR", str(Path(__file__).parent.parent / "app" / "email-templates" / "build")
+        ),
+        "USERS_OPEN_REGISTRATION": "true",
+        "METRICS_ENABLED": "true",
+        "METRICS_TOKEN": args.metrics_token,
+        # Only used without JWT_KEYS_DIR; one process, so any key will do
+        "SECRET_KEY": os.getenv("SECRET_KEY") or secrets.token_urlsafe(32),
+        # Every bench request comes from one IP and reuses a few hundred emails
+        "RATE_LIMIT_BACKEND": "none",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_ready(session: aiohttp.ClientSession, base_url: str, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with {process.returncode} during startup")
+        try:
+            async with session.get(f"{base_url}/.well-known/jwks.json") as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("app did not become ready within 60s")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    cash = smtp = process = None
+    base_url = args.base_url
+    if base_url is None:
+        cash = FakeCashService(port=args.cash_port, latency=args.cash_latency_ms / 1000)
+        smtp = SMTPSink(port=args.smtp_port)
+        await cash.start()
+        await smtp.start()
+        process = start_app(args)
+        base_url = f"http://127.0.0.1:{args.port}"
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            if process is not None:
+                await wait_ready(session, base_url, process)
+            bench = Bench(session, base_url, args)
+            await bench.seed()
+            scenarios = {}
+            for scenario in args.scenarios.split(","):
+                scenarios[scenario] = await bench.run_scenario(scenario)
+                print(f"{scenario}: {scenarios[scenario]}", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if cash is not None:
+            await cash.stop()
+            await smtp.stop()
+    return {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "users": args.users,
+            "cash_latency_ms": args.cash_latency_ms,
+        },
+        "scenarios": scenarios,
+        "neighbours": {
+            "cash_requests": cash.requests if cash else None,
+            "emails": len(smtp.messages) if smtp else None,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the identity hot paths")
+    parser.add_argument("--base-url", help="drive an already running server instead of booting one")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--cash-port", type=int, default=8765)
+    parser.add_argument("--cash-latency-ms", type=float, default=5)
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    parser.add_argument("--requests", type=int, help="stop a scenario after this many requests")
+    parser.add_argument("--warmup", type=int, default=20, help="requests per scenario before measuring")
+    parser.add_argument("--users", type=int, default=200, help="bench users to seed")
+    parser.add_argument("--admin-email", default=os.getenv("FIRST_SUPERUSER"))
+    parser.add_argument("--admin-password", default=os.getenv("FIRST_SUPERUSER_PASSWORD"))
+    parser.add_argument("--metrics-token", default=os.getenv("METRICS_TOKEN"))
+    parser.add_argument("--output", help="write the report here as well as to stdout")
+    parser.add_argument("--compare", help="report from an earlier run to compare against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {sorted(unknown)}, expected some of {list(SCENARIOS)}")
+
+    if not args.base_url and not args.metrics_token:
+        args.metrics_token = secrets.token_urlsafe()
+    report = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            report["compared_to"] = {"file": args.compare, "change_percent": compare(report, json.load(f))}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
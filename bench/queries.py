@@ -0,0 +1,81 @@
+"""
+Compare the login lookup as the ORM used to build it against the prebuilt,
+projected statement in app.crud.user.
+
+    python -m bench.queries [--email EMAIL] [--iterations N]
+
+Runs against the configured database and prints per-query CPU and latency
+for both, plus the plan Postgres picks for the projected lookup. The plan
+only shows an index-only scan once the table is big enough for an index to
+pay off and has been vacuumed recently.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.crud.user import GET_CREDENTIALS
+from app.db.session import SessionLocal
+from app.models.user import User
+
+
+async def measure(run: Callable[[], Awaitable[Any]], iterations: int) -> Dict[str, float]:
+    for _ in range(min(iterations, 100)):
+        await run()
+    latencies = []
+    cpu_started_at = time.process_time()
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await run()
+        latencies.append(time.perf_counter() - started_at)
+    cpu = time.process_time() - cpu_started_at
+    latencies.sort()
+    return {
+        "cpu_us_per_query": cpu / iterations * 1e6,
+        "mean_us": statistics.mean(latencies) * 1e6,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    email = args.email.lower()
+    async with SessionLocal() as db:
+        async def orm_entity() -> Any:
+            result = await db.execute(select(User).filter(User.email == email))
+            user = result.scalars().first()
+            db.expunge_all()
+            return user
+
+        async def prebuilt_projection() -> Any:
+            result = await db.execute(GET_CREDENTIALS, {"email": email})
+            return result.first()
+
+        results = {
+            "orm_entity": await measure(orm_entity, args.iterations),
+            "prebuilt_projection": await measure(prebuilt_projection, args.iterations),
+        }
+        plan = await db.execute(
+            text(
+                'EXPLAIN SELECT id, hashed_password, is_active FROM "user" WHERE email = :email'
+            ),
+            {"email": email},
+        )
+        results["plan"] = [row[0] for row in plan]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the login lookup")
+    parser.add_argument("--email", default=settings.FIRST_SUPERUSER)
+    parser.add_argument("--iterations", type=int, default=5000)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare encoding user responses through the response model against the
+FAST_RESPONSES path in app.utils.fast_response.
+
+    python -m bench.serialization [--rows 1000] [--iterations N]
+
+Encodes a single user and a list of `--rows` users both ways, as the users
+endpoints would, and prints the time per response. No database is needed:
+the users are built in memory. The list endpoints read plain rows rather
+than User instances on the fast path, so its list figures here are on the
+conservative side.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from app.api.v1.endpoints.users import router
+from app.core.config import settings
+from app.models.user import User
+from app.utils import fast_response
+
+
+def make_users(count: int) -> List[User]:
+    return [
+        User(
+            id=i,
+            email=f"user{i}@example.com",
+            nickname=f"user{i}",
+            is_active=True,
+            is_superuser=False,
+            hashed_password="x",
+            version=1,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def response_field(path: str, method: str) -> Any:
+    for route in router.routes:
+        if route.path == path and method in route.methods:
+            return route.secure_cloned_response_field
+    raise LookupError(f"no {method} {path} route")
+
+
+async def measure(run: Callable[[], Awaitable[bytes]], iterations: int) -> Dict[str, float]:
+    for _ in range(min(iterations, 20)):
+        body = await run()
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started_at)
+    timings.sort()
+    return {
+        "mean_us": statistics.mean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+        "bytes": len(body),
+    }
+
+
+async def compare(users: Any, field: Any, iterations: int) -> Dict[str, Any]:
+    async def response_model() -> bytes:
+        content = await serialize_response(field=field, response_content=users)
+        return JSONResponse(content).body
+
+    async def fast() -> bytes:
+        return fast_response.users_response(users).body
+
+    orjson = fast_response.orjson
+    results = {"response_model": await measure(response_model, iterations)}
+    if orjson is not None:
+        results["fast_orjson"] = await measure(fast, iterations)
+    fast_response.orjson = None
+    try:
+        results["fast_stdlib_json"] = await measure(fast, iterations)
+    finally:
+        fast_response.orjson = orjson
+    baseline = results["response_model"]["mean_us"]
+    for name, result in results.items():
+        result["speedup"] = baseline / result["mean_us"]
+    return results
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    settings.FAST_RESPONSES = True
+    users = make_users(args.rows)
+    return {
+        "single_user": await compare(users[0], response_field("/me", "GET"), args.iterations),
+        f"list_{args.rows}": await compare(
+            users, response_field("", "GET"), max(1, args.iterations // 100)
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark user response encoding")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=10000)
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,4 @@
 #! /usr/bin/env bash
 
-# Let the DB start
-python app/script/backend_pre_start.py
-
-# Run migrations
-alembic upgrade head
-
-# Create initial data in DB
-python app/script/initial_data.py
\ No newline at end of file
+# Wait for the DB, run migrations and create initial data in one interpreter
+python -m app.script.prestart